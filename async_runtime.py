@@ -0,0 +1,284 @@
+"""
+Консольная версия на одном цикле asyncio.
+
+Дисплей, расписание и опрос датчиков планируются одним циклом событий:
+порт Nextion читается через add_reader (или отдельным потоком, если у
+порта нет файлового дескриптора), авторежим — таймерами call_at, а
+блокирующие драйверы датчиков уходят в пул потоков и не держат цикл.
+Устройства, датчики и обработчики команд — те же объекты, что и в main.
+
+Запуск: python run_console.py --asyncio
+"""
+import asyncio
+import io
+import signal
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Event
+
+import main
+from config.config import Exporter, Instrumentation
+from telemetry.instrumentation import instrumentation
+
+
+class AsyncRuntime:
+    # Пауза перед повторным чтением порта после ошибки; удваивается до предела
+    DISPLAY_RETRY_DELAY = 0.5
+    DISPLAY_MAX_RETRY_DELAY = 30.0
+    # Как restart_delay у Supervisor: повтор упавшего авторежима и фоновых писателей
+    RESTART_DELAY = 1.0
+
+    def __init__(self, join_timeout: float = 2.0):
+        self.__join_timeout = join_timeout
+        self.__polls = main.sensors.get_polls()
+        # По потоку на датчик и АЦП: медленный MH-Z19 не задерживает остальных,
+        # а без опроса потоки просто спят в очереди пула
+        self.__executor = ThreadPoolExecutor(max_workers=len(self.__polls) + 1,
+                                             thread_name_prefix="sensor")
+        # Отдельный поток для порта без файлового дескриптора
+        self.__serial_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial")
+        # Фоновые писатели (история, экспортёр) останавливаются по этому событию
+        self.__thread_stop = Event()
+        self.__loop = None
+        self.__stopping = None
+        self.__reader_fd = None
+        self.__reader_retry = None
+        self.__display_delay = self.DISPLAY_RETRY_DELAY
+        self.__auto_handle = None
+        self.__tasks = []
+        self.__background = {}
+
+    def run(self):
+        instrumentation.enabled = Instrumentation.ENABLED
+        asyncio.run(self.main())
+
+    def stop(self):
+        if self.__stopping is not None:
+            self.__stopping.set()
+
+    async def main(self):
+        loop = self.__loop = asyncio.get_running_loop()
+        self.__stopping = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.__handle_signal, signum)
+        if hasattr(signal, 'SIGUSR1'):
+            loop.add_signal_handler(signal.SIGUSR1,
+                                    lambda: print(instrumentation.format_stats()))
+
+        self.__start_display()
+        main.scheduler.add_wake_listener(self.__wake_auto)
+        self.__schedule_auto()
+
+        for name, (interval, poll) in self.__polls.items():
+            self.__tasks.append(loop.create_task(
+                self.__poll_sensor(name, interval, poll), name=f"sensor:{name}"))
+        self.__tasks.append(loop.create_task(self.__sample_adc(), name="adc"))
+
+        self.__start_background("history-store", main.history_store.run)
+        if Exporter.ENABLED:
+            self.__start_background("exporter", main.exporter.run)
+
+        print("Start listening sensors...\n")
+        print("Start main")
+        try:
+            await self.__stopping.wait()
+        finally:
+            await self.__shutdown()
+
+    def __handle_signal(self, signum):
+        print(f"\n[asyncio] Получен сигнал {signal.Signals(signum).name}, завершение...")
+        self.stop()
+
+    # Дисплей
+
+    def __start_display(self):
+        try:
+            fd = main.device.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fd = None
+
+        if fd is None:
+            self.__tasks.append(self.__loop.create_task(self.__read_display(), name="main"))
+            return
+        self.__reader_fd = fd
+        self.__loop.add_reader(fd, self.__on_display_readable)
+
+    def __on_display_readable(self):
+        # Дескриптор готов — read() вернёт уже пришедшие байты без ожидания
+        try:
+            chunk = main.device.read(main.device.in_waiting or 1)
+            if not chunk:
+                raise OSError("display port is readable but returned no data")
+        except Exception as ex:
+            # Неисправный дескриптор остаётся «готовым» и крутил бы цикл вхолостую
+            self.__loop.remove_reader(self.__reader_fd)
+            self.__reader_retry = self.__loop.call_later(
+                self.__get_display_delay(ex), self.__resume_display)
+            return
+        self.__display_delay = self.DISPLAY_RETRY_DELAY
+        self.__handle_chunk(chunk)
+
+    def __resume_display(self):
+        self.__reader_retry = None
+        if self.__stopping.is_set():
+            return
+        try:
+            self.__loop.add_reader(self.__reader_fd, self.__on_display_readable)
+        except (OSError, ValueError) as ex:
+            self.__reader_retry = self.__loop.call_later(
+                self.__get_display_delay(ex), self.__resume_display)
+
+    async def __read_display(self):
+        """Запасной путь: блокирующее чтение порта в своём потоке"""
+        while True:
+            try:
+                chunk = await self.__loop.run_in_executor(
+                    self.__serial_executor,
+                    lambda: main.device.read(main.device.in_waiting or 1))
+            except Exception as ex:
+                await asyncio.sleep(self.__get_display_delay(ex))
+                continue
+            self.__display_delay = self.DISPLAY_RETRY_DELAY
+            if chunk:
+                self.__handle_chunk(chunk)
+
+    def __get_display_delay(self, ex: Exception) -> float:
+        """Пауза до следующей попытки чтения порта после ошибки ex"""
+        delay = self.__display_delay
+        self.__display_delay = min(delay * 2, self.DISPLAY_MAX_RETRY_DELAY)
+        print(f"Error occurred on display port, retry in {delay:.1f} s", ex, sep="\n")
+        instrumentation.count("display_errors", "serial")
+        return delay
+
+    @staticmethod
+    def __handle_chunk(chunk: bytes):
+        for frame in main.reader.parse(chunk):
+            main.handle_frame(frame)
+
+    # Авторежим
+
+    def __wake_auto(self):
+        # wake() вызывают и обработчики команд, и потоки датчиков
+        try:
+            self.__loop.call_soon_threadsafe(self.__schedule_auto)
+        except RuntimeError:
+            # Цикл уже закрыт — идёт завершение
+            pass
+
+    def __schedule_auto(self):
+        if self.__auto_handle is not None:
+            self.__auto_handle.cancel()
+            self.__auto_handle = None
+
+        loop = self.__loop
+        measured = instrumentation.enabled
+        if measured:
+            started = loop.time()
+        try:
+            timeout = main.scheduler.step()
+        except Exception:
+            # Без повторного таймера авторежим заснул бы до следующего wake()
+            print(f"[asyncio] Ошибка авторежима, повтор через {self.RESTART_DELAY} с:")
+            traceback.print_exc()
+            instrumentation.count("worker_errors", "auto")
+            self.__auto_handle = loop.call_later(self.RESTART_DELAY, self.__schedule_auto)
+            return
+        if timeout is None:
+            return
+        deadline = loop.time() + timeout
+        if measured:
+            instrumentation.observe("callback_ms", "auto", (loop.time() - started) * 1000)
+        self.__auto_handle = loop.call_at(deadline, self.__on_auto_timer, deadline)
+
+    def __on_auto_timer(self, deadline: float):
+        self.__auto_handle = None
+        if instrumentation.enabled:
+            instrumentation.observe("wake_lag_ms", "auto", (self.__loop.time() - deadline) * 1000)
+        self.__schedule_auto()
+
+    # Датчики
+
+    async def __poll_sensor(self, name: str, interval: float, poll: callable):
+        loop = self.__loop
+        while True:
+            deadline = loop.time() + interval
+            await asyncio.sleep(interval)
+            measured = instrumentation.enabled
+            if measured:
+                woke = loop.time()
+                instrumentation.observe("wake_lag_ms", name, (woke - deadline) * 1000)
+            try:
+                await loop.run_in_executor(self.__executor, poll)
+            except Exception as ex:
+                print(f"Error occurred on sensor {name}", ex, sep="\n")
+            if measured:
+                instrumentation.observe("poll_ms", name, (loop.time() - woke) * 1000)
+
+    async def __sample_adc(self):
+        while True:
+            await self.__loop.run_in_executor(self.__executor, main.adc.sample_all)
+            await asyncio.sleep(main.adc.get_interval())
+
+    # Фоновые писатели
+
+    def __start_background(self, name: str, worker: callable):
+        if self.__stopping.is_set():
+            return
+        future = self.__loop.run_in_executor(None, worker, self.__thread_stop)
+        future.add_done_callback(partial(self.__on_background_done, name, worker))
+        self.__background[name] = future
+
+    def __on_background_done(self, name: str, worker: callable, future: asyncio.Future):
+        """Перезапуск упавшего или вышедшего раньше времени писателя, как у Supervisor"""
+        if future.cancelled():
+            return
+        ex = future.exception()
+        if self.__stopping.is_set():
+            return
+        if ex is None:
+            print(f"[asyncio] Поток {name} завершился раньше времени")
+        else:
+            print(f"[asyncio] Поток {name} упал:")
+            traceback.print_exception(ex)
+        instrumentation.count("worker_errors", name)
+        self.__loop.call_later(self.RESTART_DELAY, self.__start_background, name, worker)
+
+    # Завершение
+
+    async def __shutdown(self):
+        if self.__reader_fd is not None:
+            self.__loop.remove_reader(self.__reader_fd)
+        if self.__reader_retry is not None:
+            self.__reader_retry.cancel()
+        if self.__auto_handle is not None:
+            self.__auto_handle.cancel()
+
+        # Прерываем блокирующее чтение порта и будим фоновых писателей
+        self.__thread_stop.set()
+        main.device.cancel_read()
+        main.history_store.wake()
+
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        if self.__background:
+            # Последняя пачка истории дописывается при завершении
+            await asyncio.wait(self.__background.values(), timeout=self.__join_timeout)
+
+        # Опросы, уже ушедшие в пул, доходят до конца до очистки GPIO
+        self.__executor.shutdown(wait=True, cancel_futures=True)
+        self.__serial_executor.shutdown(wait=False, cancel_futures=True)
+
+        main.device_bank.all_off()
+        main.device.close()
+        main.GPIO.cleanup()
+
+
+def run():
+    """Запуск консольной версии на цикле asyncio"""
+    AsyncRuntime().run()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,277 @@
+"""
+Микробенчмарки горячих путей цикла управления на эмулированном оборудовании.
+
+Запуск из корня проекта:
+    python -m benchmarks.run -o bench.json
+    python -m benchmarks.run -k state -o bench.json   # только часть бенчмарков
+
+Результат — JSON с окружением и временем одной операции (нс) по каждому
+бенчмарку, чтобы сравнивать прогоны между собой.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from statistics import median
+from time import perf_counter
+
+# Оборудование — только симулятор, время модели стоит на месте:
+# MH-Z19 не спит, показания зависят только от seed
+os.environ['CITY_FARM_EMULATION'] = '1'
+os.environ['CITY_FARM_SPEEDUP'] = 'manual'
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import city_farm_class as cfc
+    from devices.sensors import SensorsState
+    from mock_hardware import farm
+
+# Без случайных отказов DHT22: иначе в замер попадает печать ошибки
+farm.dht_fail_rate = 0.0
+
+BENCHMARKS = {}
+
+
+def silent(*args, **kwargs):
+    pass
+
+
+def benchmark(name: str):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+class StopAfter:
+    """Заменитель Event для рабочих циклов: отпускает цикл ровно n раз"""
+
+    def __init__(self, n: int = 1):
+        self.n = n
+
+    def wait(self, timeout=None) -> bool:
+        self.n -= 1
+        return self.n < 0
+
+    def is_set(self) -> bool:
+        return self.n < 0
+
+
+def measure(func, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Время одной операции: число повторов в пачке подбирается так,
+    чтобы пачка шла не меньше min_time секунд"""
+    number = 1
+    while True:
+        started = perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = perf_counter() - started
+        if elapsed >= min_time or number >= 10 ** 7:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    runs = [elapsed]
+    for _ in range(repeat - 1):
+        started = perf_counter()
+        for _ in range(number):
+            func()
+        runs.append(perf_counter() - started)
+
+    per_op = [run / number * 1e9 for run in runs]
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min_ns': min(per_op),
+        'median_ns': median(per_op),
+        'max_ns': max(per_op),
+        'ops_per_sec': 1e9 / min(per_op),
+    }
+
+
+@benchmark("watering")
+def bench_watering(workdir):
+    start = cfc.convert_time("07:00")
+    end = cfc.convert_time("21:00")
+    return lambda: cfc.watering(start, end, 2, 4, 2)
+
+
+@benchmark("convert_time")
+def bench_convert_time(workdir):
+    return lambda: cfc.convert_time("07:00")
+
+
+@benchmark("read_file:cached")
+def bench_read_file_cached(workdir):
+    path = os.path.join(workdir, 'settings.json')
+    cfc.read_file(path)
+    return lambda: cfc.read_file(path)
+
+
+@benchmark("read_file:cold")
+def bench_read_file_cold(workdir):
+    path = os.path.join(workdir, 'settings.json')
+
+    def run():
+        # После сброса кэша read_file печатает настройки — замеряем только чтение и разбор
+        print_settings = cfc.print_settings
+        cfc.print_settings = silent
+        try:
+            cfc.settings_cache.invalidate(path)
+            cfc.read_file(path)
+        finally:
+            cfc.print_settings = print_settings
+
+    return run
+
+
+@benchmark("write_file")
+def bench_write_file(workdir):
+    path = os.path.join(workdir, 'settings.json')
+    settings = cfc.read_file(path)
+    return lambda: cfc.write_file(settings, path)
+
+
+@benchmark("convert_val")
+def bench_convert_val(workdir):
+    return lambda: cfc.convert_val('n1.val', 21)
+
+
+@benchmark("convert_txt")
+def bench_convert_txt(workdir):
+    return lambda: cfc.convert_txt('t1.txt', 23.4)
+
+
+def state_setter(subscribers: int, priority: bool):
+    def setup(workdir):
+        state = SensorsState()
+        for _ in range(subscribers):
+            state.subscribe("on_change:temperature", priority=priority)(lambda value: None)
+        values = [20.0, 21.0]
+        i = 0
+
+        def run():
+            nonlocal i
+            i ^= 1
+            state.temperature = values[i]
+
+        return run
+
+    return setup
+
+
+for _count in (0, 1, 10, 100):
+    benchmark(f"state_setter:sync:{_count}")(state_setter(_count, True))
+for _count in (1, 10):
+    benchmark(f"state_setter:async:{_count}")(state_setter(_count, False))
+
+
+def import_main(workdir):
+    """main создаёт всё оборудование при импорте — делаем это один раз"""
+    if 'main' not in sys.modules:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main
+    return sys.modules['main']
+
+
+@benchmark("sensors_poll_cycle")
+def bench_sensors_poll_cycle(workdir):
+    main = import_main(workdir)
+    workers = main.sensors.get_workers()
+
+    def run():
+        # Один проход: пачка АЦП и по одному опросу каждого датчика
+        for pin in (main.ADS.P0, main.ADS.P1):
+            main.adc.sample(pin)
+        for worker in workers.values():
+            worker(StopAfter(1))
+
+    return run
+
+
+@benchmark("nextion_command_path")
+def bench_nextion_command_path(workdir):
+    main = import_main(workdir)
+    frames = b''.join(command + cfc.end_byte for command in (
+        b'page0', b'lamp_on', b'lamp_off', b'doz_1_on', b'doz_1_off', b'page3', b'auto_off',
+    ))
+    null = io.StringIO()
+
+    class Drained:
+        # main() останавливается, когда все кадры из порта разобраны
+        def is_set(self):
+            return not main.device.in_waiting
+
+    def run():
+        main.device.feed(frames)
+        null.seek(0)
+        null.truncate()
+        with contextlib.redirect_stdout(null):
+            main.main(Drained())
+
+    return run
+
+
+def get_environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'commit': commit,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих путей")
+    parser.add_argument('-o', '--output', help="файл для JSON (по умолчанию stdout)")
+    parser.add_argument('-k', '--filter', default='', help="подстрока имени бенчмарка")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    # main и settings работают с относительными путями — прогоняем во временном каталоге
+    workdir = tempfile.mkdtemp(prefix='city-farm-bench-')
+    shutil.copy(os.path.join(PROJECT_DIR, 'settings.json'), workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = {}
+    try:
+        # Отладочная печать проекта не должна смешиваться с JSON в stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            for name, setup in BENCHMARKS.items():
+                if args.filter not in name:
+                    continue
+                results[name] = measure(setup(workdir), args.repeat, args.min_time)
+                print(f"{name:32} {results[name]['min_ns']:12.1f} ns")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps({'environment': get_environment(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
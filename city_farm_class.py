@@ -1,10 +1,15 @@
 import os
-from datetime import datetime, time, timedelta
+from bisect import bisect_left, bisect_right
+from copy import deepcopy
+from dataclasses import dataclass, replace
+from datetime import date, datetime, time, timedelta
 from json import load, dump
+from threading import Lock
 
-import RPi.GPIO as GPIO
+from devices.devices import DeviceBank, IDevice
+from hardware_manager import hardware
 
-from devices.devices import IDevice
+GPIO = hardware['GPIO']
 
 # Глобальная переменная для переопределения датчиков
 sensor_overrides = {
@@ -27,14 +32,17 @@ def get_sensor_override(sensor_type):
 end_byte = b'\xff\xff\xff'
 
 
-def setup_devices(devices: list[IDevice], debug: bool = True):
+def setup_devices(devices: list[IDevice], debug: bool = True) -> DeviceBank:
     if debug: print("[setup]")
 
-    for device in devices:
-        GPIO.setup(device.get_pin(), 0, initial=GPIO.HIGH)
-        if debug: print("  ", device.get_name(), "connected;")
+    bank = DeviceBank(devices)
+    bank.setup()
+    if debug:
+        for device in devices:
+            print("  ", device.get_name(), "connected;")
 
     if debug: print()
+    return bank
 
 
 def convert_time(item, hour=0):
@@ -45,38 +53,118 @@ def convert_time(item, hour=0):
         hours=int(hour))
 
 
-last_settings = None
+DEFAULT_SETTINGS = {
+    "lamp_set": [
+        "07:00",
+        "21:00"
+    ],
+    "water_day": 1,
+    "water_night": 0,
+    "time_water": 2
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    lamp_set: tuple[str, str]
+    water_day: int
+    water_night: int
+    time_water: int
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Settings':
+        return cls(
+            lamp_set=(data['lamp_set'][0], data['lamp_set'][1]),
+            water_day=int(data['water_day']),
+            water_night=int(data['water_night']),
+            time_water=int(data['time_water']),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "lamp_set": list(self.lamp_set),
+            "water_day": self.water_day,
+            "water_night": self.water_night,
+            "time_water": self.time_water
+        }
+
+    def replace(self, **changes) -> 'Settings':
+        return replace(self, **changes)
+
+
+class SettingsCache:
+    """Кэш файлов настроек: файл перечитывается только при смене mtime/размера"""
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__entries = {}
+
+    def get(self, path_to_file: str) -> tuple[dict, Settings]:
+        stat = os.stat(path_to_file)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self.__lock:
+            entry = self.__entries.get(path_to_file)
+            if entry is not None and entry[0] == stamp:
+                return entry[1], entry[2]
+
+            with open(path_to_file, 'r') as f:
+                data = load(f)
+            if entry is None or entry[1] != data:
+                print_settings(data)
+            return self.__store(path_to_file, stamp, data)
+
+    def put(self, path_to_file: str, data: dict):
+        stat = os.stat(path_to_file)
+        with self.__lock:
+            entry = self.__entries.get(path_to_file)
+            if entry is None or entry[1] != data:
+                print_settings(data)
+            self.__store(path_to_file, (stat.st_mtime_ns, stat.st_size), deepcopy(data))
+
+    def invalidate(self, path_to_file: str | None = None):
+        with self.__lock:
+            if path_to_file is None:
+                self.__entries.clear()
+            else:
+                self.__entries.pop(path_to_file, None)
+
+    def __store(self, path_to_file, stamp, data) -> tuple[dict, Settings]:
+        settings = Settings.from_dict(data)
+        self.__entries[path_to_file] = (stamp, data, settings)
+        return data, settings
+
+
+settings_cache = SettingsCache()
+
+
+def read_settings(path_to_file='settings.json') -> Settings:
+    if not os.path.exists(path_to_file):
+        write_file(DEFAULT_SETTINGS, path_to_file)
+    return settings_cache.get(path_to_file)[1]
 
 
 def read_file(path_to_file='settings.json'):
-    global last_settings
-    if os.path.exists('settings.json'):
-        with open(path_to_file, 'r') as f:
-            data = load(f)
-        if data != last_settings:
-            print_settings(data)
-            last_settings = data
-        return data
-    else:
-        write_file({
-            "lamp_set": [
-                "07:00",
-                "21:00"
-            ],
-            "water_day": 1,
-            "water_night": 0,
-            "time_water": 2
-        })
+    if not os.path.exists(path_to_file):
+        write_file(DEFAULT_SETTINGS, path_to_file)
+    # Копия: вызывающий код может менять словарь перед write_file
+    return deepcopy(settings_cache.get(path_to_file)[0])
+
+
+def write_settings(settings: Settings, path_to_file='settings.json'):
+    write_file(settings.to_dict(), path_to_file)
 
 
 def write_file(_list, path_to_file='settings.json'):
-    with open(path_to_file, 'w') as f:
+    # Запись через временный файл: читатель никогда не увидит половину JSON
+    tmp_path = path_to_file + '.tmp'
+    with open(tmp_path, 'w') as f:
         dump(_list, f, indent=4)
+    os.replace(tmp_path, path_to_file)
+    settings_cache.put(path_to_file, _list)
 
 
-def watering(start: datetime, end: datetime, time_watering: int,
-             watering_day: int, watering_night: int):
-    now = datetime.now()
+def watering_events(start: datetime, end: datetime, time_watering: int,
+                    watering_day: int, watering_night: int) -> list:
     daytime = end - start
     night = timedelta(hours=24) - daytime
     interval_day = daytime / watering_day if watering_day > 0 else timedelta()
@@ -95,13 +183,83 @@ def watering(start: datetime, end: datetime, time_watering: int,
             event_end = event_start + timedelta(minutes=time_watering)
             all_events.append((event_start, event_end))
     all_events.sort(key=lambda x: x[0])
-    for event in all_events:
+    return all_events
+
+
+def watering(start: datetime, end: datetime, time_watering: int,
+             watering_day: int, watering_night: int):
+    now = datetime.now()
+    for event in watering_events(start, end, time_watering, watering_day,
+                                 watering_night):
         if event[1] < now: continue
         return event
 
     return None
 
 
+class DaySchedule:
+    """Расписание лампы и поливов на один день, скомпилированное из настроек"""
+
+    def __init__(self, settings: Settings, day: date):
+        self.day = day
+        self.lamp_start = self.__at(settings.lamp_set[0])
+        self.lamp_end = self.__at(settings.lamp_set[1])
+        self.events = watering_events(self.lamp_start, self.lamp_end,
+                                      settings.time_water, settings.water_day,
+                                      settings.water_night)
+        # Все поливы одной длительности, поэтому концы отсортированы вместе с началами
+        self.__ends = [event[1] for event in self.events]
+        # Моменты, в которые может измениться состояние лампы или помпы
+        self.__transitions = sorted(
+            {self.lamp_start, self.lamp_end,
+             datetime.combine(day + timedelta(days=1), time())}
+            | {moment for event in self.events for moment in event}
+        )
+
+    def __at(self, item: str) -> datetime:
+        h = int(item.split(':')[0])
+        m = int(item.split(':')[1])
+        return datetime.combine(self.day, time(hour=h, minute=m))
+
+    def is_lamp_on(self, now: datetime) -> bool:
+        return self.lamp_start <= now < self.lamp_end
+
+    def current_watering(self, now: datetime):
+        """То же, что watering(): ближайший незавершённый полив или None"""
+        index = bisect_left(self.__ends, now)
+        if index < len(self.events):
+            return self.events[index]
+        return None
+
+    def is_watering(self, now: datetime) -> bool:
+        event = self.current_watering(now)
+        return event is not None and event[0] <= now < event[1]
+
+    def next_transition(self, now: datetime) -> datetime:
+        """Ближайший момент после now, когда нужно пересчитать состояние"""
+        index = bisect_right(self.__transitions, now)
+        if index < len(self.__transitions):
+            return self.__transitions[index]
+        return datetime.combine(now.date() + timedelta(days=1), time())
+
+
+class ScheduleEngine:
+    """Перекомпилирует DaySchedule только при смене настроек или дня"""
+
+    def __init__(self):
+        self.__settings = None
+        self.__schedule = None
+
+    def get(self, settings: Settings, now: datetime) -> DaySchedule:
+        schedule = self.__schedule
+        if schedule is None or schedule.day != now.date() \
+                or (settings is not self.__settings and settings != self.__settings):
+            schedule = DaySchedule(settings, now.date())
+            self.__settings = settings
+            self.__schedule = schedule
+        return schedule
+
+
 def convert_val(name, value):
     name = str(name).encode()
     value = str(value).encode()
@@ -10,4 +10,40 @@ class Pins:
     DOSER_4: int = 26
     DHT: int = 4
     WATER_LOW_SENSOR: int = 23
-    WATER_HIGH_SENSOR: int = 27
\ No newline at end of file
+    WATER_HIGH_SENSOR: int = 27
+
+
+@dataclass
+class SensorIntervals:
+    TEMPERATURE: float = 2
+    HUMIDITY: float = 2
+    CO2: float = 5
+    EC: float = 2
+    PH: float = 2
+    WATER: float = 1
+
+    @classmethod
+    def as_dict(cls) -> dict:
+        return {
+            "temperature": cls.TEMPERATURE,
+            "humidity": cls.HUMIDITY,
+            "co2": cls.CO2,
+            "ec": cls.EC,
+            "ph": cls.PH,
+            "water": cls.WATER,
+        }
+
+
+@dataclass
+class Instrumentation:
+    # Гистограммы задержек; при False точки замера не вызывают perf_counter()
+    ENABLED: bool = True
+
+
+@dataclass
+class Exporter:
+    # HTTP /metrics для Prometheus; по умолчанию выключен
+    ENABLED: bool = False
+    HOST: str = "0.0.0.0"
+    PORT: int = 9100
+    CACHE_SECONDS: float = 1.0
@@ -1,6 +1,11 @@
 import string
+from contextlib import ExitStack
+from threading import Lock
+from time import perf_counter
 
-import RPi.GPIO as GPIO
+from hardware_manager import hardware
+
+GPIO = hardware['GPIO']
 
 SIG_ON = 0
 SIG_OFF = 1
@@ -9,6 +14,10 @@ class IDevice:
     def __init__(self, pin: int):
         self.__pin = pin
         self._name = f"device[{pin}]"
+        # Теневой регистр выхода: setup_devices выставляет initial=HIGH, т.е. выключено
+        self.__working = False
+        self._lock = Lock()
+        self.__subscribers = {}
 
     def get_pin(self) -> int:
         return self.__pin
@@ -16,14 +25,57 @@ class IDevice:
     def get_name(self) -> string:
         return self._name
 
+    def subscribe(self, event):
+        def decorator(callback):
+            if event not in self.__subscribers:
+                self.__subscribers[event] = []
+            self.__subscribers[event].append(callback)
+            return callback
+
+        return decorator
+
+    def _notify(self, event, value):
+        if event in self.__subscribers:
+            for callback in self.__subscribers[event]:
+                callback(value)
+
     def on(self):
-        GPIO.output(self.__pin, SIG_ON)
+        self._set_working(True)
 
     def off(self):
-        GPIO.output(self.__pin, SIG_OFF)
+        self._set_working(False)
 
     def is_working(self) -> bool:
-        return not GPIO.input(self.__pin)
+        return self.__working
+
+    def sync(self) -> bool:
+        """Перечитать реальное состояние пина в теневой регистр"""
+        self._set_shadow(not GPIO.input(self.__pin))
+        return self.__working
+
+    def _set_working(self, working: bool):
+        # GPIO пишется только при реальном переключении; аварийное выключение —
+        # DeviceBank.all_off(), он пишет пины без оглядки на теневой регистр
+        with self._lock:
+            if self.__working == working:
+                return
+            GPIO.output(self.__pin, SIG_ON if working else SIG_OFF)
+            changed = self._store_working(working)
+        if changed:
+            self._notify("on_change:working", working)
+
+    def _set_shadow(self, working: bool):
+        """Обновить теневой регистр после записи в GPIO в обход on()/off()"""
+        with self._lock:
+            changed = self._store_working(working)
+        if changed:
+            self._notify("on_change:working", working)
+
+    def _store_working(self, working: bool) -> bool:
+        """Запись теневого регистра; вызывающий держит _lock"""
+        changed = self.__working != working
+        self.__working = working
+        return changed
 
 class Lamp(IDevice):
     def __init__(self, pin: int):
@@ -39,3 +91,75 @@ class Doser(IDevice):
     def __init__(self, pin: int):
         super().__init__(pin)
         self._name = f"dozer[{pin}]"
+
+
+class DeviceBank:
+    """Группа устройств, переключаемых одним вызовом GPIO со списком каналов"""
+
+    def __init__(self, devices: list[IDevice]):
+        # Порядок по пину: блокировки устройств всегда берутся в одном порядке
+        self.__devices = sorted(devices, key=lambda device: device.get_pin())
+        self.__lock = Lock()
+        self.__stats = {}
+
+    def get_devices(self) -> list[IDevice]:
+        return list(self.__devices)
+
+    def setup(self):
+        started = perf_counter()
+        pins = [device.get_pin() for device in self.__devices]
+        try:
+            GPIO.setup(pins, GPIO.OUT, initial=GPIO.HIGH)
+        except (TypeError, ValueError):
+            for pin in pins:
+                GPIO.setup(pin, GPIO.OUT, initial=GPIO.HIGH)
+        for device in self.__devices:
+            device._set_shadow(False)
+        self.__record("setup", started)
+
+    def set(self, states: dict[IDevice, bool]):
+        """Переключить несколько устройств одной записью: {устройство: включено}"""
+        started = perf_counter()
+        devices = [device for device in self.__devices if device in states]
+        changed = []
+        with self.__lock, ExitStack() as stack:
+            for device in devices:
+                stack.enter_context(device._lock)
+            self.__output([device.get_pin() for device in devices],
+                          [SIG_ON if states[device] else SIG_OFF for device in devices])
+            for device in devices:
+                if device._store_working(states[device]):
+                    changed.append(device)
+        self.__record("set", started)
+
+        for device in changed:
+            device._notify("on_change:working", states[device])
+
+    def all_on(self):
+        self.set({device: True for device in self.__devices})
+
+    def all_off(self):
+        """Аварийное выключение: пишет все пины без оглядки на теневые регистры"""
+        self.set({device: False for device in self.__devices})
+
+    def get_stats(self) -> dict:
+        """Длительность групповых операций: {операция: (число, последняя мс, максимум мс)}"""
+        with self.__lock:
+            return dict(self.__stats)
+
+    @staticmethod
+    def __output(pins: list, values: list):
+        if not pins:
+            return
+        try:
+            GPIO.output(pins, values)
+        except (TypeError, ValueError):
+            # Бэкенд без списков каналов — пишем по одному, но под общими блокировками
+            for pin, value in zip(pins, values):
+                GPIO.output(pin, value)
+
+    def __record(self, operation: str, started: float):
+        elapsed = (perf_counter() - started) * 1000
+        with self.__lock:
+            count, _, worst = self.__stats.get(operation, (0, 0.0, 0.0))
+            self.__stats[operation] = (count + 1, elapsed, max(worst, elapsed))
@@ -0,0 +1,168 @@
+"""
+Доставка событий SensorsState подписчикам вне потока опроса датчиков
+"""
+from collections import deque
+from threading import Condition, Thread, Timer
+from time import monotonic, perf_counter
+
+# Политики переполнения очереди подписчика
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+# В очереди остаётся только последнее значение — для событий вида on_change
+MERGE = "merge"
+
+_NOTHING = object()
+
+
+class Subscription:
+    """Подписчик со своей ограниченной очередью и потоком-обработчиком.
+    priority=True — синхронный вызов прямо в потоке публикации.
+
+    Фильтры проверяются при публикации, до постановки в очередь:
+    deadband — числовое значение доставляется, только если отличается от
+    последнего доставленного хотя бы на deadband;
+    hysteresis — смена направления изменения требует deadband + hysteresis;
+    min_interval — не чаще раза в min_interval секунд, последнее
+    отброшенное значение доставляется по истечении интервала."""
+
+    def __init__(self, event: str, callback: callable, priority: bool = False,
+                 queue_size: int = 64, policy: str = DROP_OLDEST,
+                 deadband: float = 0.0, min_interval: float = 0.0,
+                 hysteresis: float = 0.0):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, MERGE):
+            raise ValueError(f"unknown queue policy: {policy}")
+        self.event = event
+        self.callback = callback
+        self.priority = priority
+        self.__queue_size = 1 if policy == MERGE else queue_size
+        self.__policy = policy
+        self.__queue = deque()
+        self.__cond = Condition()
+        self.__thread = None
+
+        self.__deadband = deadband
+        self.__min_interval = min_interval
+        self.__hysteresis = hysteresis
+        self.__filtering = bool(deadband or min_interval or hysteresis)
+        self.__last_value = _NOTHING
+        self.__last_time = 0.0
+        self.__direction = 0
+        self.__trailing = _NOTHING
+        self.__timer = None
+
+        self.__stats = {
+            'filtered': 0,
+            'delivered': 0,
+            'dropped': 0,
+            'merged': 0,
+            'errors': 0,
+            'max_depth': 0,
+            'latency_total_ms': 0.0,
+            'latency_max_ms': 0.0,
+        }
+
+    def get_name(self) -> str:
+        name = getattr(self.callback, '__qualname__', repr(self.callback))
+        return f"{self.event}:{name}"
+
+    def deliver(self, value):
+        if self.__filtering and not self.__accept(value):
+            return
+        self.__dispatch(value)
+
+    def __dispatch(self, value):
+        if self.priority:
+            self.__run(value)
+            return
+
+        with self.__cond:
+            if len(self.__queue) >= self.__queue_size:
+                if self.__policy == DROP_NEWEST:
+                    self.__stats['dropped'] += 1
+                    return
+                self.__queue.popleft()
+                self.__stats['merged' if self.__policy == MERGE else 'dropped'] += 1
+            self.__queue.append(value)
+            self.__stats['max_depth'] = max(self.__stats['max_depth'], len(self.__queue))
+
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__loop, name=f"event:{self.get_name()}",
+                                       daemon=True)
+                self.__thread.start()
+            self.__cond.notify()
+
+    def __accept(self, value) -> bool:
+        with self.__cond:
+            numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+            last = self.__last_value
+            direction = 0
+            if last is not _NOTHING and numeric and isinstance(last, (int, float)):
+                delta = value - last
+                direction = (delta > 0) - (delta < 0)
+                threshold = self.__deadband
+                if self.__direction and direction and direction != self.__direction:
+                    threshold += self.__hysteresis
+                if abs(delta) < threshold:
+                    # Значение вернулось к доставленному — отложенное больше не актуально
+                    self.__stats['filtered'] += 1
+                    self.__trailing = _NOTHING
+                    return False
+
+            now = monotonic()
+            wait = self.__last_time + self.__min_interval - now
+            if last is not _NOTHING and wait > 0:
+                # Слишком рано: запоминаем значение и доставим его по таймеру
+                self.__stats['filtered'] += 1
+                self.__trailing = value
+                if self.__timer is None:
+                    self.__timer = Timer(wait, self.__flush_trailing)
+                    self.__timer.daemon = True
+                    self.__timer.start()
+                return False
+
+            self.__last_value = value
+            self.__last_time = now
+            if direction:
+                self.__direction = direction
+            self.__trailing = _NOTHING
+            return True
+
+    def __flush_trailing(self):
+        with self.__cond:
+            self.__timer = None
+            value, self.__trailing = self.__trailing, _NOTHING
+        if value is not _NOTHING:
+            self.deliver(value)
+
+    def get_stats(self) -> dict:
+        with self.__cond:
+            stats = dict(self.__stats)
+            stats['depth'] = len(self.__queue)
+        handled = stats['delivered'] + stats['errors']
+        stats['latency_avg_ms'] = stats['latency_total_ms'] / handled if handled else 0.0
+        stats['priority'] = self.priority
+        return stats
+
+    def __loop(self):
+        while True:
+            with self.__cond:
+                while not self.__queue:
+                    self.__cond.wait()
+                value = self.__queue.popleft()
+            self.__run(value)
+
+    def __run(self, value):
+        started = perf_counter()
+        try:
+            self.callback(value)
+            ok = True
+        except Exception as ex:
+            ok = False
+            print(f"Error occurred in subscriber {self.get_name()}", ex, sep="\n")
+        elapsed = (perf_counter() - started) * 1000
+
+        with self.__cond:
+            self.__stats['delivered' if ok else 'errors'] += 1
+            self.__stats['latency_total_ms'] += elapsed
+            if elapsed > self.__stats['latency_max_ms']:
+                self.__stats['latency_max_ms'] = elapsed
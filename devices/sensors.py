@@ -1,17 +1,48 @@
 import string
-from time import sleep
-from threading import Thread
-
-import busio
-from mh_z19 import read_from_pwm
-from adafruit_dht import DHT22
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-import RPi.GPIO as GPIO
+from array import array
+from contextlib import contextmanager
+from statistics import fmean, median
+from time import monotonic, perf_counter
+# Без подчёркивания "import *" в gui_main затенял бы datetime.time
+from time import time as _now
+from typing import NamedTuple
+from threading import Event, Lock, RLock, Thread
+
+from devices.events import DROP_OLDEST, Subscription
+from hardware_manager import hardware
+from telemetry.instrumentation import instrumentation
+
+GPIO = hardware['GPIO']
+DHT22 = hardware['DHT22']
+ADS = hardware['ADS1115']
+AnalogIn = hardware['AnalogIn']
+read_from_pwm = hardware['read_from_pwm']
+
+
+class SensorsSnapshot(NamedTuple):
+    """Согласованный срез SensorsState: все поля из одной версии"""
+    temperature: float
+    humidity: float
+    co2: float
+    ec: float
+    ph: float
+    water_value_dis: int
+    block_water: bool
+    version: int
+    timestamp: float
 
 
 class SensorsState:
-    def __init__(self):
+    FIELDS = ("temperature", "humidity", "co2", "ec", "ph", "water_value_dis", "block_water")
+
+    __slots__ = (
+        "_temperature", "_humidity", "_co2", "_ec", "_ph",
+        "_water_value_dis", "_block_water",
+        "_subscribers", "_sinks", "_lock", "_async_dispatch",
+        "_version", "_timestamp", "_batch_depth", "_batch_events",
+    )
+
+    def __init__(self, async_dispatch: bool = True):
         self._temperature = 0
         self._humidity = 0
         self._co2 = 0
@@ -20,20 +51,116 @@ class SensorsState:
         self._water_value_dis = 0
         self._block_water = True
         self._subscribers = {}
-
-    def subscribe(self, event):
+        self._sinks = []
+        self._lock = RLock()
+        self._version = 0
+        self._timestamp = _now()
+        self._batch_depth = 0
+        self._batch_events = []
+        # Обычные подписчики вызываются из своих очередей, а не в потоке опроса
+        self._async_dispatch = async_dispatch
+
+    def subscribe(self, event, priority: bool = False, queue_size: int = 64,
+                  policy: str = DROP_OLDEST, deadband: float = 0.0,
+                  min_interval: float = 0.0, hysteresis: float = 0.0):
+        """priority=True — синхронная доставка в потоке датчика раньше остальных,
+        для защитных обработчиков вроде отключения помпы.
+        deadband/min_interval/hysteresis отсекают незначимые изменения (см. Subscription)"""
         def decorator(callback):
-            if event not in self._subscribers:
-                self._subscribers[event] = []
-            self._subscribers[event].append(callback)
+            subscription = Subscription(
+                event, callback,
+                priority=priority or not self._async_dispatch,
+                queue_size=queue_size,
+                policy=policy,
+                deadband=deadband,
+                min_interval=min_interval,
+                hysteresis=hysteresis,
+            )
+            subscribers = self._subscribers.get(event, [])
+            # Новый список вместо изменения на месте: _notify может идти параллельно
+            self._subscribers[event] = sorted(
+                subscribers + [subscription], key=lambda sub: not sub.priority)
             return callback
 
         return decorator
 
+    def get_bus_stats(self) -> dict:
+        """Глубина очередей, потери и время обработчиков по каждому подписчику"""
+        stats = {}
+        for subscriptions in list(self._subscribers.values()):
+            for subscription in subscriptions:
+                name = subscription.get_name()
+                if name in stats:
+                    name = f"{name}#{id(subscription):x}"
+                stats[name] = subscription.get_stats()
+        return stats
+
+    def add_sink(self, sink: callable):
+        """sink(field, value, timestamp) получает каждое опубликованное значение,
+        а не только изменения — для истории и агрегатов"""
+        self._sinks.append(sink)
+
+    def get_version(self) -> int:
+        return self._version
+
+    def snapshot(self) -> SensorsSnapshot:
+        with self._lock:
+            return SensorsSnapshot(
+                self._temperature, self._humidity, self._co2, self._ec, self._ph,
+                self._water_value_dis, self._block_water,
+                self._version, self._timestamp,
+            )
+
+    @contextmanager
+    def batch(self):
+        """Значения, записанные внутри блока, публикуются атомарно одной версией:
+        snapshot() не увидит половину опроса, события уходят после блока"""
+        events = None
+        try:
+            with self._lock:
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+                    if self._batch_depth == 0:
+                        events, self._batch_events = self._batch_events, []
+                        if events:
+                            self._commit()
+        finally:
+            for event, value in events or ():
+                self._notify(event, value)
+
+    def publish(self, **values):
+        with self.batch():
+            for field, value in values.items():
+                self._set(field, value)
+
+    def _set(self, field, value):
+        if self._sinks:
+            timestamp = _now()
+            for sink in self._sinks:
+                sink(field, value, timestamp)
+
+        # Датчики опрашиваются из разных потоков: сравнение и запись атомарны
+        attr = "_" + field
+        with self._lock:
+            if getattr(self, attr) == value:
+                return
+            setattr(self, attr, value)
+            if self._batch_depth:
+                self._batch_events.append(("on_change:" + field, value))
+                return
+            self._commit()
+        self._notify("on_change:" + field, value)
+
+    def _commit(self):
+        self._version += 1
+        self._timestamp = _now()
+
     def _notify(self, event, value):
-        if event in self._subscribers:
-            for callback in self._subscribers[event]:
-                callback(value)
+        for subscription in self._subscribers.get(event, ()):
+            subscription.deliver(value)
 
     @property
     def temperature(self):
@@ -41,9 +168,7 @@ class SensorsState:
 
     @temperature.setter
     def temperature(self, value):
-        if self._temperature != value:
-            self._temperature = value
-            self._notify("on_change:temperature", value)
+        self._set("temperature", value)
 
     @property
     def humidity(self):
@@ -51,9 +176,7 @@ class SensorsState:
 
     @humidity.setter
     def humidity(self, value):
-        if self._humidity != value:
-            self._humidity = value
-            self._notify("on_change:humidity", value)
+        self._set("humidity", value)
 
     @property
     def co2(self):
@@ -61,9 +184,7 @@ class SensorsState:
 
     @co2.setter
     def co2(self, value):
-        if self._co2 != value:
-            self._co2 = value
-            self._notify("on_change:co2", value)
+        self._set("co2", value)
 
     @property
     def ec(self):
@@ -71,9 +192,7 @@ class SensorsState:
 
     @ec.setter
     def ec(self, value):
-        if self._ec != value:
-            self._ec = value
-            self._notify("on_change:ec", value)
+        self._set("ec", value)
 
     @property
     def ph(self):
@@ -81,9 +200,7 @@ class SensorsState:
 
     @ph.setter
     def ph(self, value):
-        if self._ph != value:
-            self._ph = value
-            self._notify("on_change:ph", value)
+        self._set("ph", value)
 
     @property
     def water_value_dis(self):
@@ -91,9 +208,7 @@ class SensorsState:
 
     @water_value_dis.setter
     def water_value_dis(self, value):
-        if self._water_value_dis != value:
-            self._water_value_dis = value
-            self._notify("on_change:water_value_dis", value)
+        self._set("water_value_dis", value)
 
     @property
     def block_water(self):
@@ -101,9 +216,7 @@ class SensorsState:
 
     @block_water.setter
     def block_water(self, value):
-        if self._block_water != value:
-            self._block_water = value
-            self._notify("on_change:block_water", value)
+        self._set("block_water", value)
 
 
 class ISensor:
@@ -117,15 +230,55 @@ class ISensor:
         pass
 
 
+class DHTReading(NamedTuple):
+    temperature: float
+    humidity: float
+    timestamp: float
+
+
 class DHTSensorWrapper:
-    def __init__(self, pin: int = 4):
+    """Общий DHT22 для датчиков температуры и влажности: одно чтение шины
+    на оба значения, не чаще min_interval секунд"""
+
+    def __init__(self, pin: int = 4, min_interval: float = 2.0, max_age: float = 30.0):
         self.__sensor = DHT22(pin)
+        self.__min_interval = min_interval
+        # Сколько секунд можно отдавать прошлое значение, если DHT22 не ответил
+        self.__max_age = max_age
+        self.__lock = Lock()
+        self.__reading = None
+        self.__last_attempt = None
+
+    def read(self) -> DHTReading:
+        with self.__lock:
+            now = monotonic()
+            if self.__last_attempt is not None \
+                    and now - self.__last_attempt < self.__min_interval:
+                if self.__reading is not None \
+                        and now - self.__reading.timestamp < self.__max_age:
+                    return self.__reading
+                raise RuntimeError("DHT22 read throttled, no fresh data")
+
+            self.__last_attempt = now
+            try:
+                temperature = self.__sensor.temperature
+                humidity = self.__sensor.humidity
+                if temperature is None or humidity is None:
+                    raise RuntimeError("DHT22 returned no data")
+            except Exception:
+                if self.__reading is not None \
+                        and now - self.__reading.timestamp < self.__max_age:
+                    return self.__reading
+                raise
+
+            self.__reading = DHTReading(temperature, humidity, now)
+            return self.__reading
 
     def read_temperature(self):
-        return self.__sensor.temperature
+        return self.read().temperature
 
     def read_humidity(self):
-        return self.__sensor.humidity
+        return self.read().humidity
 
 
 class TemperatureSensor(ISensor):
@@ -157,21 +310,112 @@ class CO2Sensor(ISensor):
         return read_from_pwm()['co2']
 
 
+class ADCSampler:
+    """Владеет ADS1115: по очереди снимает с каждого канала пачку из samples
+    измерений и хранит отфильтрованное напряжение"""
+
+    def __init__(self, ads: 'ADS.ADS1115', samples: int = 8, interval: float = 1.0,
+                 data_rate: int | None = 860, reducer: str = "median"):
+        self.__ads = ads
+        if data_rate is not None:
+            # Быстрое преобразование: пачка из 8 измерений на 860 SPS короче
+            # одиночного чтения на частоте по умолчанию (128 SPS)
+            ads.data_rate = data_rate
+        self.__samples = samples
+        self.__interval = interval
+        self.__reduce = median if reducer == "median" else fmean
+        self.__lock = Lock()
+        self.__channels = {}
+        self.__buffers = {}
+        self.__values = {}
+        self.__stop = Event()
+
+    def channel(self, pin) -> 'SampledChannel':
+        with self.__lock:
+            if pin not in self.__channels:
+                self.__channels[pin] = AnalogIn(self.__ads, pin)
+                self.__buffers[pin] = array('f', bytes(4 * self.__samples))
+        return SampledChannel(self, pin)
+
+    def sample(self, pin) -> float:
+        """Пачка измерений одного канала; АЦП один, поэтому под общей блокировкой"""
+        with self.__lock:
+            chan = self.__channels[pin]
+            buffer = self.__buffers[pin]
+            started = perf_counter() if instrumentation.enabled else None
+            for i in range(self.__samples):
+                buffer[i] = chan.voltage
+            value = self.__reduce(buffer)
+            if started is not None:
+                instrumentation.observe("adc_sample_ms", f"adc:{pin}",
+                                        (perf_counter() - started) * 1000)
+            self.__values[pin] = (value, monotonic())
+            return value
+
+    def get_voltage(self, pin) -> float:
+        entry = self.__values.get(pin)
+        if entry is None or monotonic() - entry[1] > 3 * self.__interval:
+            # Фоновый цикл не запущен или отстаёт — измеряем сами
+            return self.sample(pin)
+        return entry[0]
+
+    def start(self):
+        Thread(target=self.run, args=(self.__stop,), name="adc", daemon=True).start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def get_interval(self) -> float:
+        return self.__interval
+
+    def sample_all(self):
+        """Один проход по всем открытым каналам"""
+        for pin in list(self.__channels):
+            try:
+                self.sample(pin)
+            except Exception as ex:
+                print(f"Error occurred on adc channel {pin}", ex, sep="\n")
+                instrumentation.count("adc_errors", f"adc:{pin}")
+
+    def run(self, stop: Event):
+        while not stop.is_set():
+            self.sample_all()
+            stop.wait(self.__interval)
+
+
+class SampledChannel:
+    """Канал ADCSampler с тем же интерфейсом, что и AnalogIn"""
+
+    def __init__(self, sampler: ADCSampler, pin):
+        self.__sampler = sampler
+        self.__pin = pin
+
+    @property
+    def voltage(self) -> float:
+        return self.__sampler.get_voltage(self.__pin)
+
+
+def analog_channel(ads: 'ADS.ADS1115 | ADCSampler', pin):
+    if isinstance(ads, ADCSampler):
+        return ads.channel(pin)
+    return AnalogIn(ads, pin)
+
+
 class PHSensor(ISensor):
-    def __init__(self, ads: ADS.ADS1115):
+    def __init__(self, ads: 'ADS.ADS1115 | ADCSampler'):
         super().__init__()
         self._name = "ph sensor"
-        self.__chan_ph = AnalogIn(ads, ADS.P1)
+        self.__chan_ph = analog_channel(ads, ADS.P1)
 
     def read(self):
         return round((self.__chan_ph.voltage * 5) * 14 / 20, 2)
 
 
 class ECSensor(ISensor):
-    def __init__(self, ads: ADS.ADS1115):
+    def __init__(self, ads: 'ADS.ADS1115 | ADCSampler'):
         super().__init__()
         self._name = "ec sensor"
-        self.__chan_ec = AnalogIn(ads, ADS.P0)
+        self.__chan_ec = analog_channel(ads, ADS.P0)
 
     def read(self):
         return round(((self.__chan_ec.voltage * 5) * 4400) / 1000 * 500 / 20, 2)
@@ -197,6 +441,7 @@ class SensorsLifecycle:
             ph: PHSensor | None,
             low_ws: WaterSensor | None,
             high_ws: WaterSensor | None,
+            intervals: dict | None = None,
     ):
         self.__state = SensorsState()
         self.__temp_sensor = temp
@@ -206,57 +451,110 @@ class SensorsLifecycle:
         self.__ph_sensor = ph
         self.__low_water_sensor = low_ws
         self.__high_water_sensor = high_ws
+        # Интервал опроса каждого датчика; отсутствующие берутся из start()
+        self.__intervals = intervals or {}
+        self.__stop = Event()
 
     def get_state(self) -> SensorsState:
         return self.__state
 
     def start(self, interval: int = 2):
         print("Start listening sensors...\n")
-        Thread(
-            target=self.__get_listener(interval),
-            daemon=True
-        ).start()
-
-    def __get_listener(self, interval: int) -> callable:
-        def listen():
+        for name, worker in self.get_workers(interval).items():
+            Thread(
+                target=worker,
+                args=(self.__stop,),
+                name=f"sensor:{name}",
+                daemon=True
+            ).start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def get_workers(self, interval: int = 2) -> dict:
+        """Рабочие циклы датчиков: у каждого свой поток и свой интервал,
+        медленный датчик не задерживает остальные"""
+        return {
+            name: self.__get_listener(name, poll_interval, poll)
+            for name, (poll_interval, poll) in self.get_polls(interval).items()
+        }
+
+    def get_polls(self, interval: int = 2) -> dict:
+        """Однократные опросы датчиков: {имя: (интервал, poll())} —
+        для планировщиков, которые сами решают, где и когда их вызывать"""
+        polls = {}
+        for name, sens in (
+                ("temperature", self.__temp_sensor),
+                ("humidity", self.__hum_sensor),
+                ("co2", self.__co2_sensor),
+                ("ec", self.__ec_sensor),
+                ("ph", self.__ph_sensor),
+        ):
+            if sens is not None:
+                polls[name] = (self.__intervals.get(name, interval),
+                               self.__get_poll(name, sens))
+
+        if not (self.__low_water_sensor is None or self.__high_water_sensor is None):
+            polls["water"] = (self.__intervals.get("water", interval), self.__poll_water)
+        return polls
+
+    @staticmethod
+    def __get_listener(name: str, interval: float, poll: callable) -> callable:
+        def listen(stop: Event):
             while True:
-                sleep(interval)
-
-                self.__state.temperature = handle_sensor(self.__temp_sensor, self.__state.temperature)
-                self.__state.humidity = handle_sensor(self.__hum_sensor, self.__state.humidity)
-                self.__state.co2 = handle_sensor(self.__co2_sensor, self.__state.co2)
-                self.__state.ec = handle_sensor(self.__ec_sensor, self.__state.ec)
-                self.__state.ph = handle_sensor(self.__ph_sensor, self.__state.ph)
-
-                if not (self.__low_water_sensor is None or self.__high_water_sensor is None):
-                    low_val = self.__low_water_sensor.read()
-                    high_val = self.__high_water_sensor.read()
-
-                    if high_val == 1 and low_val == 1:
-                        self.__state.block_water = True
-                        self.__state.water_value_dis = 0
-                    elif high_val == 0 and low_val == 0:
-                        self.__state.block_water = True
-                        self.__state.water_value_dis = 90
-                    elif high_val == 1 and low_val == 0:
-                        self.__state.block_water = False
-                        self.__state.water_value_dis = 100
-                    elif high_val == 0 and low_val == 1:
-                        self.__state.block_water = True
-                        self.__state.water_value_dis = 50
+                measured = instrumentation.enabled
+                if measured:
+                    # Плановое пробуждение — конец ожидания interval
+                    deadline = perf_counter() + interval
+                if stop.wait(interval):
+                    return
+                if measured:
+                    woke = perf_counter()
+                    instrumentation.observe("wake_lag_ms", name, (woke - deadline) * 1000)
+                poll()
+                if measured:
+                    instrumentation.observe("poll_ms", name, (perf_counter() - woke) * 1000)
 
         return listen
 
+    def __get_poll(self, name: str, sens: ISensor) -> callable:
+        def poll():
+            setattr(self.__state, name,
+                    read_sensor(sens, getattr(self.__state, name)))
+
+        return poll
+
+    def __poll_water(self):
+        low_val = self.__low_water_sensor.read()
+        high_val = self.__high_water_sensor.read()
+
+        # Оба поля публикуются одной версией состояния
+        if high_val == 1 and low_val == 1:
+            self.__state.publish(block_water=True, water_value_dis=0)
+        elif high_val == 0 and low_val == 0:
+            self.__state.publish(block_water=True, water_value_dis=90)
+        elif high_val == 1 and low_val == 0:
+            self.__state.publish(block_water=False, water_value_dis=100)
+        elif high_val == 0 and low_val == 1:
+            self.__state.publish(block_water=True, water_value_dis=50)
+
 
 def read_sensor(sens: ISensor, alt_value):
+    started = perf_counter() if instrumentation.enabled else None
     try:
-        return sens.read()
+        value = sens.read()
     except Exception as ex:
         print(
             f"Error occurred on {sens.get_name()}",
             ex, sep="\n"
         )
+        # Ошибки считаются всегда: это счётчик, а не замер времени
+        instrumentation.count("sensor_errors", sens.get_name())
         return alt_value
+    if started is not None:
+        instrumentation.observe("sensor_read_ms", sens.get_name(),
+                                (perf_counter() - started) * 1000)
+    return value
 
 
 def handle_sensor(sens: ISensor | None, alt):
@@ -2,7 +2,10 @@ import logging
 import sys
 from datetime import datetime, time
 
-from PyQt5.QtCore import QTimer, Qt, pyqtSignal, QThread
+from threading import Lock
+from time import perf_counter
+
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal
 from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QGridLayout, QGroupBox, QLabel,
@@ -16,9 +19,13 @@ from hardware_manager import hardware
 from city_farm_class import setup_devices, read_file, write_file, \
     set_sensor_override, get_sensor_override
 # Импортируем твои модули
-from config.config import Pins
+from config.config import Instrumentation, Pins, SensorIntervals
 from devices.devices import Lamp, Pump, Doser
+from devices.events import MERGE
 from devices.sensors import *
+from telemetry.history import SensorsHistory
+from telemetry.instrumentation import instrumentation
+from telemetry.rollups import SensorsRollups
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -28,7 +35,8 @@ logger = logging.getLogger(__name__)
 GPIO = hardware['GPIO']
 DHT22 = hardware['DHT22']
 Serial = hardware['Serial']
-busio = type('Busio', (), {'I2C': hardware['I2C']})()
+I2C = hardware['I2C']
+board = hardware['board']
 ADS = hardware['ADS1115']
 AnalogIn = hardware['AnalogIn']
 read_from_pwm = hardware['read_from_pwm']
@@ -82,42 +90,109 @@ class SensorOverrideDialog(QDialog):
         self.setLayout(layout)
 
 
-class SensorThread(QThread):
+class SensorSignalBridge(QObject):
+    """Мост от событий SensorsState к Qt: пачка изменений за frame_ms
+    уходит в GUI одним сигналом и только с изменившимися полями"""
     data_updated = pyqtSignal(dict)
-
-    def __init__(self, sensors_lifecycle):
-        super().__init__()
-        self.sensors = sensors_lifecycle
-        self.running = True
+    _changed = pyqtSignal()
+
+    # Поле SensorsState -> ключ в словаре для update_sensor_display
+    FIELDS = {
+        'temperature': 'temperature',
+        'humidity': 'humidity',
+        'co2': 'co2',
+        'ph': 'ph',
+        'ec': 'ec',
+        'water_value_dis': 'water_level',
+        'block_water': 'block_water',
+    }
+
+    # Фильтры подписки: шум АЦП и DHT22 не перерисовывает плитки, а значения
+    # приходят не чаще раза в секунду; блокировку воды показываем сразу
+    FILTERS = {
+        'temperature': {'deadband': 0.1, 'min_interval': 1.0},
+        'humidity': {'deadband': 0.5, 'min_interval': 1.0},
+        'co2': {'min_interval': 1.0},
+        'ph': {'deadband': 0.05, 'min_interval': 1.0},
+        'ec': {'deadband': 0.05, 'min_interval': 1.0},
+        'water_value_dis': {'min_interval': 1.0},
+    }
+
+    def __init__(self, sensors_state, frame_ms=100, parent=None):
+        super().__init__(parent)
+        self.state = sensors_state
+        self.frame_ms = frame_ms
+        self._lock = Lock()
+        self._pending = {}
+        # Обработчики вызываются в потоках датчиков — в GUI-поток через очередь
+        self._changed.connect(self._schedule_flush, Qt.QueuedConnection)
+
+        for field, key in self.FIELDS.items():
+            self.state.subscribe(f"on_change:{field}", policy=MERGE,
+                                 **self.FILTERS.get(field, {}))(self._get_handler(key))
+
+    def _get_handler(self, key):
+        def handler(value):
+            self._push({key: value})
+
+        return handler
+
+    def refresh(self):
+        """Отправить все поля разом, например при старте или смене фильтров"""
+        snapshot = self.state.snapshot()
+        self._push({key: getattr(snapshot, field)
+                    for field, key in self.FIELDS.items()})
+
+    def _push(self, values):
+        with self._lock:
+            first = not self._pending
+            self._pending.update(values)
+        if first:
+            self._changed.emit()
+
+    def _schedule_flush(self):
+        QTimer.singleShot(self.frame_ms, self._flush)
+
+    def _flush(self):
+        with self._lock:
+            data, self._pending = self._pending, {}
+        if data:
+            self.data_updated.emit(data)
+
+
+class HardwareInitThread(QThread):
+    """Инициализация оборудования в фоне: окно показывается сразу,
+    а подсистемы оживают по мере готовности"""
+    phase_ready = pyqtSignal(str, float)
+    phase_failed = pyqtSignal(str, str)
+
+    def __init__(self, phases, parent=None):
+        super().__init__(parent)
+        # [(название этапа, функция инициализации)]
+        self.phases = phases
 
     def run(self):
-        while self.running:
+        for name, init in self.phases:
+            started = perf_counter()
             try:
-                state = self.sensors.get_state()
-                sensor_data = {
-                    'temperature': state.temperature,
-                    'humidity': state.humidity,
-                    'co2': state.co2,
-                    'ph': state.ph,
-                    'ec': state.ec,
-                    'water_level': state.water_value_dis,
-                    'block_water': state.block_water
-                }
-                self.data_updated.emit(sensor_data)
-                self.msleep(2000)  # Обновление каждые 2 секунды
+                init()
             except Exception as e:
-                logger.error(f"Ошибка в потоке датчиков: {e}")
-
-    def stop(self):
-        self.running = False
+                self.phase_failed.emit(name, str(e))
+            else:
+                self.phase_ready.emit(name, (perf_counter() - started) * 1000)
 
 
 class DeviceControlWidget(QGroupBox):
+    # Изменение состояния устройства может прийти из любого потока
+    state_changed = pyqtSignal(bool)
+
     def __init__(self, device, name, parent=None):
         super().__init__(name, parent)
         self.device = device
         self.name = name
         self.init_ui()
+        self.state_changed.connect(self.show_state, Qt.QueuedConnection)
+        self.device.subscribe("on_change:working")(self.state_changed.emit)
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -133,20 +208,31 @@ class DeviceControlWidget(QGroupBox):
         layout.addWidget(self.toggle_btn)
         self.setLayout(layout)
 
+    def set_initializing(self):
+        self.setEnabled(False)
+        self.status_label.setText("Статус: инициализация...")
+        self.status_label.setStyleSheet("color: gray; font-weight: bold;")
+
+    def set_ready(self):
+        self.setEnabled(True)
+        self.update_status()
+
+    def set_failed(self):
+        self.setEnabled(False)
+        self.status_label.setText("Статус: ошибка GPIO")
+        self.status_label.setStyleSheet("color: red; font-weight: bold;")
+
     def toggle_device(self, checked):
         if checked:
             self.device.on()
-            self.status_label.setText("Статус: Включено")
-            self.status_label.setStyleSheet("color: green; font-weight: bold;")
-            self.toggle_btn.setText("Выключить")
         else:
             self.device.off()
-            self.status_label.setText("Статус: Выключено")
-            self.status_label.setStyleSheet("color: red; font-weight: bold;")
-            self.toggle_btn.setText("Включить")
+        self.show_state(checked)
 
     def update_status(self):
-        is_working = self.device.is_working()
+        self.show_state(self.device.is_working())
+
+    def show_state(self, is_working):
         self.toggle_btn.setChecked(is_working)
         if is_working:
             self.status_label.setText("Статус: Включено")
@@ -167,13 +253,18 @@ class SensorDisplayWidget(QGroupBox):
     def init_ui(self):
         layout = QVBoxLayout()
 
-        self.value_label = QLabel("--")
+        self.value_label = QLabel("Инициализация...")
         self.value_label.setFont(QFont("Arial", 16, QFont.Bold))
         self.value_label.setAlignment(Qt.AlignCenter)
+        self.value_label.setStyleSheet("color: gray;")
 
         layout.addWidget(self.value_label)
         self.setLayout(layout)
 
+    def set_unavailable(self):
+        self.value_label.setText("Нет связи")
+        self.value_label.setStyleSheet("color: gray;")
+
     def set_value(self, value):
         if value is not None:
             self.value_label.setText(f"{value} {self.unit}")
@@ -204,8 +295,13 @@ class SensorDisplayWidget(QGroupBox):
 class HydroPonicGUI(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.startup_started = perf_counter()
+        self.startup_times = {}
+
+        started = perf_counter()
         self.auto_mode = False
         self.settings = read_file()
+        self.mark_startup("settings", started)
 
         # Настройки отключения датчиков
         self.sensor_overrides = {
@@ -215,15 +311,65 @@ class HydroPonicGUI(QMainWindow):
             'ec_sensor': False
         }
 
-        self.init_devices()
-        self.init_sensors()
+        self.device_bank = None
+        self.sensors = None
+        self.sensors_state = None
+        self.last_sensor_data = {}
+
+        # Окно строится без обращения к оборудованию
+        started = perf_counter()
+        self.create_devices()
         self.init_ui()
-        self.setup_sensor_thread()
+        for control in self.get_device_controls():
+            control.set_initializing()
+        self.mark_startup("ui", started)
+
+        # GPIO, I2C, АЦП и DHT22 поднимаются в фоне
+        self.hardware_thread = HardwareInitThread([
+            ("devices", self.init_devices),
+            ("sensors", self.init_sensors),
+        ], parent=self)
+        self.hardware_thread.phase_ready.connect(self.on_hardware_ready)
+        self.hardware_thread.phase_failed.connect(self.on_hardware_failed)
+        self.hardware_thread.start()
+
+    def mark_startup(self, phase, started):
+        """Запомнить длительность этапа запуска в мс"""
+        self.startup_times[phase] = (perf_counter() - started) * 1000
+        logger.info(f"Запуск: {phase} — {self.startup_times[phase]:.1f} мс")
+
+    def on_hardware_ready(self, phase, elapsed_ms):
+        self.startup_times[phase] = elapsed_ms
+        since_start = (perf_counter() - self.startup_started) * 1000
+        logger.info(f"Запуск: {phase} — {elapsed_ms:.1f} мс, "
+                    f"готово через {since_start:.1f} мс после старта")
+
+        if phase == "devices":
+            for control in self.get_device_controls():
+                control.set_ready()
+        elif phase == "sensors":
+            self.setup_sensor_bridge()
+
+    def on_hardware_failed(self, phase, error):
+        logger.error(f"Ошибка инициализации ({phase}): {error}")
+
+        if phase == "devices":
+            for control in self.get_device_controls():
+                control.set_failed()
+        elif phase == "sensors":
+            self.sensors = None
+            self.sensors_state = None
+            for widget in (self.temp_sensor, self.hum_sensor, self.co2_sensor,
+                           self.ph_sensor, self.ec_sensor):
+                widget.set_unavailable()
+            self.water_status_label.setText("Статус: датчики недоступны")
+            self.water_status_label.setStyleSheet("color: gray;")
 
-    def init_devices(self):
-        """Инициализация устройств"""
-        GPIO.setmode(GPIO.BCM)
+    def get_device_controls(self):
+        return [self.lamp_control, self.pump_control] + self.doser_controls
 
+    def create_devices(self):
+        """Объекты устройств; пины настраиваются позже в init_devices"""
         self.lamp = Lamp(Pins.LAMP)
         self.pump = Pump(Pins.PUMP)
         self.dozers = [
@@ -233,65 +379,70 @@ class HydroPonicGUI(QMainWindow):
             Doser(Pins.DOSER_4)
         ]
 
-        setup_devices([self.lamp, self.pump] + self.dozers)
+    def init_devices(self):
+        """Инициализация устройств (фоновый поток)"""
+        GPIO.setmode(GPIO.BCM)
+        self.device_bank = setup_devices([self.lamp, self.pump] + self.dozers)
 
     def init_sensors(self):
-        """Инициализация сенсоров"""
-        try:
-            self.dht_wrapper = DHTSensorWrapper(pin=Pins.DHT)
-
-            # Инициализация I2C и ADS1115
-            i2c = busio.I2C(board.SCL, board.SDA)
-            ads = ADS.ADS1115(i2c)
-
-            # Настройка водных сенсоров
-            GPIO.setup(Pins.WATER_LOW_SENSOR, GPIO.OUT,
-                       pull_up_down=GPIO.PUD_UP)
-            GPIO.setup(Pins.WATER_HIGH_SENSOR, GPIO.OUT,
-                       pull_up_down=GPIO.PUD_UP)
-
-            low_water_sensor = WaterSensor(Pins.WATER_LOW_SENSOR)
-            high_water_sensor = WaterSensor(Pins.WATER_HIGH_SENSOR)
-
-            # Создание сенсоров
-            temp_sensor = TemperatureSensor(self.dht_wrapper)
-            hum_sensor = HumiditySensor(self.dht_wrapper)
-            co2_sensor = CO2Sensor()
-            ph_sensor = PHSensor(ads)
-            ec_sensor = ECSensor(ads)
-
-            self.sensors = SensorsLifecycle(
-                temp=temp_sensor,
-                hum=hum_sensor,
-                co2=co2_sensor,
-                ph=ph_sensor,
-                ec=ec_sensor,
-                low_ws=low_water_sensor,
-                high_ws=high_water_sensor,
-            )
-
-            self.sensors.start(interval=2)
-            self.sensors_state = self.sensors.get_state()
-
-            # Подписка на изменения датчика воды
-            @self.sensors_state.subscribe("on_change:block_water")
-            def handle_water_block_change(value):
-                # Останавливаем помпу только если датчик воды не отключен
-                if not get_sensor_override('water_sensor') and not value:
-                    self.pump.off()
-                    logger.info("Помпа отключена по сигналу датчика воды")
-
-        except Exception as e:
-            logger.error(f"Ошибка инициализации сенсоров: {e}")
-            self.sensors = None
-            self.sensors_state = None
+        """Инициализация сенсоров (фоновый поток)"""
+        self.dht_wrapper = DHTSensorWrapper(pin=Pins.DHT)
+
+        # Инициализация I2C и ADS1115
+        i2c = I2C(board.SCL, board.SDA)
+        ads = ADS.ADS1115(i2c)
+        self.adc = ADCSampler(ads)
+
+        # Настройка водных сенсоров
+        GPIO.setup(Pins.WATER_LOW_SENSOR, GPIO.IN,
+                   pull_up_down=GPIO.PUD_UP)
+        GPIO.setup(Pins.WATER_HIGH_SENSOR, GPIO.IN,
+                   pull_up_down=GPIO.PUD_UP)
+
+        low_water_sensor = WaterSensor(Pins.WATER_LOW_SENSOR)
+        high_water_sensor = WaterSensor(Pins.WATER_HIGH_SENSOR)
+
+        # Создание сенсоров
+        temp_sensor = TemperatureSensor(self.dht_wrapper)
+        hum_sensor = HumiditySensor(self.dht_wrapper)
+        co2_sensor = CO2Sensor()
+        ph_sensor = PHSensor(self.adc)
+        ec_sensor = ECSensor(self.adc)
+
+        self.sensors = SensorsLifecycle(
+            temp=temp_sensor,
+            hum=hum_sensor,
+            co2=co2_sensor,
+            ph=ph_sensor,
+            ec=ec_sensor,
+            low_ws=low_water_sensor,
+            high_ws=high_water_sensor,
+            intervals=SensorIntervals.as_dict(),
+        )
 
-    def setup_sensor_thread(self):
-        """Запуск потока для обновления данных сенсоров"""
+        sensors_state = self.sensors.get_state()
+        self.history = SensorsHistory().attach(sensors_state)
+        self.rollups = SensorsRollups().attach(sensors_state)
+
+        # Подписка на изменения датчика воды — до первого опроса
+        @sensors_state.subscribe("on_change:block_water",
+                                 priority=True)
+        def handle_water_block_change(value):
+            # Останавливаем помпу только если датчик воды не отключен
+            if not get_sensor_override('water_sensor') and not value:
+                self.pump.off()
+                logger.info("Помпа отключена по сигналу датчика воды")
+
+        self.adc.start()
+        self.sensors.start(interval=2)
+        self.sensors_state = sensors_state
+
+    def setup_sensor_bridge(self):
+        """Подписка GUI на изменения данных сенсоров"""
         if self.sensors_state:
-            self.sensor_thread = SensorThread(self.sensors)
-            self.sensor_thread.data_updated.connect(self.update_sensor_display)
-            self.sensor_thread.start()
+            self.sensor_bridge = SensorSignalBridge(self.sensors_state, parent=self)
+            self.sensor_bridge.data_updated.connect(self.update_sensor_display)
+            self.sensor_bridge.refresh()
 
     def init_ui(self):
         """Инициализация интерфейса"""
@@ -418,7 +569,8 @@ class HydroPonicGUI(QMainWindow):
             }
         """)
 
-        self.water_status_label = QLabel("Статус: Норма")
+        self.water_status_label = QLabel("Статус: инициализация...")
+        self.water_status_label.setStyleSheet("color: gray;")
 
         # Кнопка отключения датчика воды
         self.water_sensor_override_btn = QPushButton(
@@ -717,26 +869,40 @@ class HydroPonicGUI(QMainWindow):
             self.sensor_status_label.setText("Датчики: ✓ Активны")
             self.sensor_status_label.setStyleSheet("color: green;")
 
+        # Фильтры отключенных датчиков изменились — перерисовываем все значения
+        if self.last_sensor_data:
+            self.update_sensor_display(dict(self.last_sensor_data))
+
     def update_sensor_display(self, data):
-        """Обновление отображения данных сенсоров"""
+        """Обновление отображения данных сенсоров (только изменившиеся поля)"""
+        self.last_sensor_data.update(data)
+
         # Игнорируем данные отключенных датчиков
-        if not self.sensor_overrides['temperature_sensor']:
-            self.temp_sensor.set_value(data['temperature'])
-        else:
-            self.temp_sensor.set_value(None)
+        if 'temperature' in data:
+            if not self.sensor_overrides['temperature_sensor']:
+                self.temp_sensor.set_value(data['temperature'])
+            else:
+                self.temp_sensor.set_value(None)
 
-        self.hum_sensor.set_value(data['humidity'])
-        self.co2_sensor.set_value(data['co2'])
+        if 'humidity' in data:
+            self.hum_sensor.set_value(data['humidity'])
+        if 'co2' in data:
+            self.co2_sensor.set_value(data['co2'])
 
-        if not self.sensor_overrides['ph_sensor']:
-            self.ph_sensor.set_value(data['ph'])
-        else:
-            self.ph_sensor.set_value(None)
+        if 'ph' in data:
+            if not self.sensor_overrides['ph_sensor']:
+                self.ph_sensor.set_value(data['ph'])
+            else:
+                self.ph_sensor.set_value(None)
 
-        if not self.sensor_overrides['ec_sensor']:
-            self.ec_sensor.set_value(data['ec'])
-        else:
-            self.ec_sensor.set_value(None)
+        if 'ec' in data:
+            if not self.sensor_overrides['ec_sensor']:
+                self.ec_sensor.set_value(data['ec'])
+            else:
+                self.ec_sensor.set_value(None)
+
+        if 'water_level' not in data:
+            return
 
         # Обновление уровня воды (всегда показываем, даже если датчик отключен)
         water_level = data['water_level']
@@ -760,17 +926,10 @@ class HydroPonicGUI(QMainWindow):
 
     def update_ui(self):
         """Обновление UI"""
-        # Время
+        # Время; состояния устройств приходят событиями DeviceControlWidget
         current_time = datetime.now().strftime("%H:%M:%S")
         self.time_label.setText(current_time)
 
-        # Обновление статусов устройств
-        self.lamp_control.update_status()
-        self.pump_control.update_status()
-
-        for doser_control in self.doser_controls:
-            doser_control.update_status()
-
     def toggle_auto_mode(self, checked):
         """Переключение режима автоматического управления"""
         self.auto_mode = checked
@@ -858,11 +1017,15 @@ class HydroPonicGUI(QMainWindow):
             )
 
         if reply == QMessageBox.Yes:
+            # Фоновая инициализация могла ещё не закончиться
+            self.hardware_thread.wait(5000)
+
             # Остановка потоков и очистка
-            if hasattr(self, 'sensor_thread'):
-                self.sensor_thread.stop()
-                self.sensor_thread.wait(2000)
+            if self.sensors:
+                self.sensors.stop()
 
+            if self.device_bank:
+                self.device_bank.all_off()
             GPIO.cleanup()
             event.accept()
         else:
@@ -870,13 +1033,16 @@ class HydroPonicGUI(QMainWindow):
 
 
 def main():
+    instrumentation.enabled = Instrumentation.ENABLED
     app = QApplication(sys.argv)
 
     # Установка стиля
     app.setStyle('Fusion')
 
+    started = perf_counter()
     window = HydroPonicGUI()
     window.show()
+    window.mark_startup("window", started)
 
     sys.exit(app.exec())
 
@@ -1,115 +1,114 @@
 """
 Менеджер оборудования - автоматически определяет ОС и подключает соответствующие драйверы
+
+Ключи словаря hardware одинаковы для реального оборудования и эмуляции:
+GPIO, DHT22, Serial, I2C, board, ADS1115 (модуль с классом ADS1115 и
+каналами P0-P3), AnalogIn, read_from_pwm, is_emulation.
+Эмуляцию можно включить принудительно переменной окружения CITY_FARM_EMULATION=1.
+
+Драйверы загружаются лениво: в словаре лежат заместители, и модуль драйвера
+импортируется только при первом обращении к нему (создании датчика,
+настройке пина). Определение платформы выполняется один раз.
 """
+import os
 import sys
-import platform
+from functools import cache
+from importlib import import_module
+from importlib.util import find_spec
 
+# Ключ -> (модуль, атрибут модуля или None для самого модуля)
+RASPBERRY_DRIVERS = {
+    'GPIO': ('RPi.GPIO', None),
+    'DHT22': ('adafruit_dht', 'DHT22'),
+    'Serial': ('serial', 'Serial'),
+    'I2C': ('busio', 'I2C'),
+    'board': ('board', None),
+    'ADS1115': ('adafruit_ads1x15.ads1115', None),
+    'AnalogIn': ('adafruit_ads1x15.analog_in', 'AnalogIn'),
+    'read_from_pwm': ('mh_z19', 'read_from_pwm'),
+}
 
-def setup_hardware():
-    """Определяет ОС и возвращает соответствующие модули"""
-
-    system = platform.system().lower()
-
-    if system == 'windows' or system == 'darwin':  # Windows или Mac
-        print("🔧 Режим эмуляции: запуск на ПК")
-
-        # Импортируем моки
-        from mock_hardware import (
-            MockGPIO as GPIO,
-            MockDHT22,
-            MockSerial,
-            MockI2C,
-            MockADS1115,
-            MockAnalogIn,
-            mock_read_from_pwm
-        )
-
-        # Создаем мок-модули
-        hardware_modules = {
-            'GPIO': GPIO,
-            'DHT22': MockDHT22,
-            'Serial': MockSerial,
-            'I2C': MockI2C,
-            'ADS1115': MockADS1115,
-            'AnalogIn': MockAnalogIn,
-            'read_from_pwm': mock_read_from_pwm,
-            'is_emulation': True
-        }
-
-    elif system == 'linux':
+EMULATION_DRIVERS = {
+    'GPIO': ('mock_hardware', 'MockGPIO'),
+    'DHT22': ('mock_hardware', 'MockDHT22'),
+    'Serial': ('mock_hardware', 'MockSerial'),
+    'I2C': ('mock_hardware', 'MockI2C'),
+    'board': ('mock_hardware', 'board'),
+    'ADS1115': ('mock_hardware', 'ADS1115'),
+    'AnalogIn': ('mock_hardware', 'MockAnalogIn'),
+    'read_from_pwm': ('mock_hardware', 'mock_read_from_pwm'),
+}
+
+
+class LazyDriver:
+    """Заместитель модуля, класса или функции драйвера до первого обращения"""
+
+    def __init__(self, module: str, attr: str | None = None):
+        self._module = module
+        self._attr = attr
+        self._target = None
+
+    def load(self):
+        if self._target is None:
+            target = import_module(self._module)
+            self._target = target if self._attr is None else getattr(target, self._attr)
+        return self._target
+
+    def is_loaded(self) -> bool:
+        return self._target is not None
+
+    def __getattr__(self, name):
+        value = getattr(self.load(), name)
+        # Следующие обращения (GPIO.output и т.п.) идут мимо __getattr__
+        setattr(self, name, value)
+        return value
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        name = self._module if self._attr is None else f"{self._module}.{self._attr}"
+        state = "loaded" if self.is_loaded() else "lazy"
+        return f"<LazyDriver {name} ({state})>"
+
+
+def is_raspberry_pi() -> bool:
+    try:
+        with open('/proc/device-tree/model', 'r') as f:
+            return 'raspberry pi' in f.read().lower()
+    except OSError:
+        return False
+
+
+@cache
+def probe() -> tuple[bool, str]:
+    """Определяет платформу один раз за процесс: (эмуляция?, сообщение)"""
+    if os.environ.get('CITY_FARM_EMULATION') == '1':
+        return True, "🔧 Режим эмуляции: включён через CITY_FARM_EMULATION"
+
+    if sys.platform.startswith(('win', 'darwin')):  # Windows или Mac
+        return True, "🔧 Режим эмуляции: запуск на ПК"
+
+    if sys.platform.startswith('linux'):
         # Проверяем, это Raspberry Pi или обычный Linux
-        try:
-            with open('/proc/device-tree/model', 'r') as f:
-                if 'raspberry pi' in f.read().lower():
-                    print(
-                        "🍓 Режим Raspberry Pi: использование реального оборудования")
-
-                    # Импортируем реальные библиотеки
-                    import RPi.GPIO as GPIO
-                    from adafruit_dht import DHT22
-                    from serial import Serial
-                    import busio
-                    import adafruit_ads1x15.ads1115 as ADS1115
-                    from adafruit_ads1x15.analog_in import AnalogIn
-                    from mh_z19 import read_from_pwm
-
-                    hardware_modules = {
-                        'GPIO': GPIO,
-                        'DHT22': DHT22,
-                        'Serial': Serial,
-                        'busio': busio,
-                        'ADS1115': ADS1115,
-                        'AnalogIn': AnalogIn,
-                        'read_from_pwm': read_from_pwm,
-                        'is_emulation': False
-                    }
-                else:
-                    raise ImportError("Не Raspberry Pi")
-        except:
-            print("🐧 Обычный Linux: режим эмуляции")
-            from mock_hardware import (
-                MockGPIO as GPIO,
-                MockDHT22,
-                MockSerial,
-                MockI2C,
-                MockADS1115,
-                MockAnalogIn,
-                mock_read_from_pwm
-            )
-
-            hardware_modules = {
-                'GPIO': GPIO,
-                'DHT22': MockDHT22,
-                'Serial': MockSerial,
-                'I2C': MockI2C,
-                'ADS1115': MockADS1115,
-                'AnalogIn': MockAnalogIn,
-                'read_from_pwm': mock_read_from_pwm,
-                'is_emulation': True
-            }
-    else:
-        print("❓ Неизвестная ОС: режим эмуляции")
-        from mock_hardware import (
-            MockGPIO as GPIO,
-            MockDHT22,
-            MockSerial,
-            MockI2C,
-            MockADS1115,
-            MockAnalogIn,
-            mock_read_from_pwm
-        )
-
-        hardware_modules = {
-            'GPIO': GPIO,
-            'DHT22': MockDHT22,
-            'Serial': MockSerial,
-            'I2C': MockI2C,
-            'ADS1115': MockADS1115,
-            'AnalogIn': MockAnalogIn,
-            'read_from_pwm': mock_read_from_pwm,
-            'is_emulation': True
-        }
+        if not is_raspberry_pi():
+            return True, "🐧 Обычный Linux: режим эмуляции"
+        # Наличие пакета проверяется без его импорта
+        if find_spec('RPi') is None:
+            return True, "⚠️ Драйверы Raspberry Pi недоступны, режим эмуляции"
+        return False, "🍓 Режим Raspberry Pi: использование реального оборудования"
+
+    return True, "❓ Неизвестная ОС: режим эмуляции"
+
+
+def setup_hardware():
+    """Определяет ОС и возвращает заместители соответствующих модулей"""
+    is_emulation, message = probe()
+    print(message)
 
+    drivers = EMULATION_DRIVERS if is_emulation else RASPBERRY_DRIVERS
+    hardware_modules = {key: LazyDriver(module, attr) for key, (module, attr) in drivers.items()}
+    hardware_modules['is_emulation'] = is_emulation
     return hardware_modules
 
 
@@ -1,15 +1,28 @@
-import RPi.GPIO as GPIO
-import board
-from serial import Serial
+import signal
+from functools import partial
+from threading import Event
+from time import perf_counter
 
 from city_farm_class import *
 # Импортируем функции для управления override
 from city_farm_class import set_sensor_override, get_sensor_override
-from config.config import Pins
+from config.config import Exporter, Instrumentation, Pins, SensorIntervals
 from devices.devices import Lamp, Pump, Doser
 from devices.sensors import *
-
-auto_mode = False
+from hardware_manager import hardware
+from nextion import NextionReader, NextionCommands, NextionDisplay
+from scheduler import AutoScheduler
+from supervisor import Supervisor
+from telemetry.exporter import MetricsExporter
+from telemetry.history import SensorsHistory
+from telemetry.instrumentation import instrumentation
+from telemetry.rollups import SensorsRollups
+from telemetry.store import HistoryStore
+
+GPIO = hardware['GPIO']
+Serial = hardware['Serial']
+I2C = hardware['I2C']
+board = hardware['board']
 
 # Devices setup
 GPIO.setmode(GPIO.BCM)
@@ -19,12 +32,14 @@ doz_1 = Doser(Pins.DOSER_1)
 doz_2 = Doser(Pins.DOSER_2)
 doz_3 = Doser(Pins.DOSER_3)
 doz_4 = Doser(Pins.DOSER_4)
-setup_devices([lamp, pump, doz_1, doz_2, doz_3, doz_4])
+all_devices = [lamp, pump, doz_1, doz_2, doz_3, doz_4]
+device_bank = setup_devices(all_devices)
 
 # Sensors setup
 dht_wrapper = DHTSensorWrapper(pin=Pins.DHT)
-i2c = busio.I2C(board.SCL, board.SDA)
+i2c = I2C(board.SCL, board.SDA)
 ads = ADS.ADS1115(i2c)
+adc = ADCSampler(ads)
 
 # Water sensors setup
 GPIO.setup(Pins.WATER_LOW_SENSOR, 1, pull_up_down=GPIO.PUD_UP)
@@ -35,8 +50,8 @@ high_water_sensor = WaterSensor(Pins.WATER_HIGH_SENSOR)
 temp_sensor = TemperatureSensor(dht_wrapper)
 hum_sensor = HumiditySensor(dht_wrapper)
 co2_sensor = CO2Sensor()
-ph_sensor = PHSensor(ads)
-ec_sensor = ECSensor(ads)
+ph_sensor = PHSensor(adc)
+ec_sensor = ECSensor(adc)
 sensors = SensorsLifecycle(
     temp=temp_sensor,
     hum=hum_sensor,
@@ -45,158 +60,185 @@ sensors = SensorsLifecycle(
     ec=ec_sensor,
     low_ws=low_water_sensor,
     high_ws=high_water_sensor,
+    intervals=SensorIntervals.as_dict(),
 )
-sensors.start(interval=2)
 sensors_state = sensors.get_state()
+history = SensorsHistory().attach(sensors_state)
+history_store = HistoryStore().attach(sensors_state)
+rollups = SensorsRollups().attach(sensors_state)
+exporter = MetricsExporter(sensors_state, all_devices, Exporter.HOST, Exporter.PORT,
+                           Exporter.CACHE_SECONDS)
 
 # Initialize display
-device = Serial('/dev/ttyS0', timeout=1)
-
-
-def txt(name, value):
-    device.write(convert_txt(name, value))
+device = Serial('/dev/ttyS0', timeout=None)
+reader = NextionReader(device)
+display = NextionDisplay(device)
+txt = display.txt
+val = display.val
 
 
-def val(name, value):
-    device.write(convert_val(name, value))
-
-
-@sensors_state.subscribe("on_change:water_value_dis")
+# Защита помпы — синхронно в потоке датчика воды, без очереди
+@sensors_state.subscribe("on_change:water_value_dis", priority=True)
 def handle_water_value_dis_change(value):
     # Останавливаем помпу только если датчик воды не отключен
     if value == 100 and not get_sensor_override('water_sensor'):
         pump.off()
 
 
-def auto():
-    while True:
-        sleep(1)
-        if not auto_mode: continue
-        state = sensors_state
-        settings = read_file()
-        if convert_time(
-                settings['lamp_set'][0]) <= datetime.now() < convert_time(
-            settings['lamp_set'][1]):
-            lamp.on()
-        else:
-            lamp.off()
-
-        watering_list = watering(convert_time(settings['lamp_set'][0]),
-                                 convert_time(settings['lamp_set'][1]),
-                                 settings['time_water'], settings['water_day'],
-                                 settings['water_night'])
-
-        # ИСПРАВЛЕННАЯ ЛОГИКА: учитываем override датчика воды
-        water_ok = state.block_water or get_sensor_override('water_sensor')
-
-        if watering_list and watering_list[0] <= datetime.now() < \
-                watering_list[1] and water_ok:
-            pump.on()
-        else:
-            pump.off()
-
-
-def main():
-    global auto_mode
+def water_ok() -> bool:
+    # ИСПРАВЛЕННАЯ ЛОГИКА: учитываем override датчика воды
+    return sensors_state.block_water or get_sensor_override('water_sensor')
+
+
+scheduler = AutoScheduler(lamp, pump, water_ok)
+
+
+@sensors_state.subscribe("on_change:block_water", priority=True)
+def handle_block_water_change(value):
+    scheduler.wake()
+
+
+commands = NextionCommands()
+
+
+def manual_only(handler):
+    """Команда выполняется только в ручном режиме"""
+    def wrapper(token, args):
+        if not scheduler.is_enabled():
+            handler(token, args)
+
+    return wrapper
+
+
+@commands.register('page0', 'page2', 'page3', 'page4')
+def on_page(token, args):
+    handle_page(token)
+
+
+@commands.register('lamp_on')
+@manual_only
+def on_lamp_on(token, args):
+    lamp.on()
+
+
+@commands.register('lamp_off')
+@manual_only
+def on_lamp_off(token, args):
+    lamp.off()
+
+
+@commands.register('pump_on')
+@manual_only
+def on_pump_on(token, args):
+    # Проверяем override перед ручным включением помпы
+    if water_ok():
+        pump.on()
+    else:
+        print("Помпа не запущена: низкий уровень воды и защита не отключена")
+
+
+@commands.register('pump_off')
+@manual_only
+def on_pump_off(token, args):
+    pump.off()
+
+
+dosers = {'doz_1': doz_1, 'doz_2': doz_2, 'doz_3': doz_3, 'doz_4': doz_4}
+
+
+@commands.register(*(f'{name}_{action}' for name in dosers for action in ('on', 'off')))
+def on_doser(token, args):
+    name, _, action = token.rpartition('_')
+    if action == 'on':
+        dosers[name].on()
+    else:
+        dosers[name].off()
+
+
+@commands.register('auto_on', 'auto_off')
+def on_auto(token, args):
+    scheduler.set_enabled(token == 'auto_on')
+
+
+@commands.register('time')
+def on_time(token, args):
+    settings = read_settings()
+    write_settings(settings.replace(lamp_set=(args[0], args[1])))
+    scheduler.wake()
+
+
+@commands.register('water')
+def on_water(token, args):
+    waterings = list(map(int, args[0].split(',')))
+    settings = read_settings()
+    write_settings(settings.replace(water_day=waterings[0],
+                                    water_night=waterings[1],
+                                    time_water=waterings[2]))
+    scheduler.wake()
+
+
+# Обработка команд отключения датчиков
+@commands.register('water_override_on', 'water_override_off')
+def on_water_override(token, args):
+    enabled = token == 'water_override_on'
+    set_sensor_override('water_sensor', enabled)
+    scheduler.wake()
+    print("Защита по воде отключена" if enabled else "Защита по воде включена")
+
+
+def main(stop: Event):
     print("Start main")
-    while True:
-        sleep(0.01)
-        info = device.read_all().decode('koi8-r')
-        if len(info) > 0: print(info)
-        if 'page' in info:
-            handle_page(info)
-
-        if not auto_mode:
-            if 'lamp_on' in info:
-                lamp.on()
-            elif "lamp_off" in info:
-                lamp.off()
-
-            if "pump_on" in info:
-                # Проверяем override перед ручным включением помпы
-                if sensors_state.block_water or get_sensor_override(
-                        'water_sensor'):
-                    pump.on()
-                else:
-                    print(
-                        "Помпа не запущена: низкий уровень воды и защита не отключена")
-            elif "pump_off" in info:
-                pump.off()
-
-        if "doz_1_on" in info:
-            doz_1.on()
-        elif "doz_1_off" in info:
-            doz_1.off()
-
-        if "doz_2_on" in info:
-            doz_2.on()
-        elif "doz_2_off" in info:
-            doz_2.off()
-
-        if "doz_3_on" in info:
-            doz_3.on()
-        elif "doz_3_off" in info:
-            doz_3.on()
-
-        if "doz_4_on" in info:
-            doz_4.on()
-        elif "doz_4_off" in info:
-            doz_4.off()
-
-        if "auto_on" in info:
-            auto_mode = True
-        elif "auto_off" in info:
-            auto_mode = False
-
-        if "time" in info:
-            h_list = info.split('/')
-            time_list = [h_list[1], h_list[2]]
-            settings = read_file()
-            settings['lamp_set'] = time_list
-            write_file(settings)
-
-        if "water" in info:
-            waterings = list(map(int, info.split('/')[1].split(',')))
-            setting = read_file()
-            setting["time_water"] = waterings[2]
-            setting["water_day"] = waterings[0]
-            setting["water_night"] = waterings[1]
-            write_file(setting)
-
-        # Обработка команд отключения датчиков
-        if "water_override_on" in info:
-            set_sensor_override('water_sensor', True)
-            print("Защита по воде отключена")
-        elif "water_override_off" in info:
-            set_sensor_override('water_sensor', False)
-            print("Защита по воде включена")
+    for frame in reader.frames(stop):
+        handle_frame(frame)
+
+
+def handle_frame(frame):
+    print(frame)
+    token = frame.partition('/')[0].strip()
+    if token.startswith('page'):
+        # Любая загрузка страницы, и без обработчика (page1), меняет текущую страницу
+        display.set_page(token)
+    if not instrumentation.enabled:
+        commands.dispatch(frame)
+        return
+
+    started = perf_counter()
+    handled = commands.dispatch(frame)
+    instrumentation.observe("command_ms", token if handled else "unknown",
+                            (perf_counter() - started) * 1000)
 
 
 def handle_page(page):
-    settings = read_file()
+    with display.page(page):
+        refresh_page(page)
+
+
+def refresh_page(page):
+    settings = read_settings()
     if 'page2' in page:
-        day = list(map(int, settings['lamp_set'][0].split(':')))
-        night = list(map(int, settings['lamp_set'][1].split(':')))
+        day = list(map(int, settings.lamp_set[0].split(':')))
+        night = list(map(int, settings.lamp_set[1].split(':')))
         val('n1.val', day[0])
         val('n0.val', day[1])
         val('n2.val', night[0])
         val('n3.val', night[1])
     if 'page4' in page:
-        val('n1.val', settings['water_day'])
-        val('n0.val', settings['water_night'])
-        val('n2.val', settings['time_water'])
+        val('n1.val', settings.water_day)
+        val('n0.val', settings.water_night)
+        val('n2.val', settings.time_water)
     if 'page0' in page:
+        state = sensors_state.snapshot()
         txt('t0.txt', datetime.now().time().strftime('%H:%M'))
-        txt('t1.txt', sensors_state.temperature)
-        txt('t2.txt', sensors_state.temperature)
-        txt('t4.txt', sensors_state.co2)
-        txt('t7.txt', sensors_state.ph)
-        txt('t9.txt', sensors_state.ec)
-        val('j0.val', sensors_state.water_value_dis)
-        val('bt2.val', int(auto_mode))
+        txt('t1.txt', state.temperature)
+        txt('t2.txt', state.temperature)
+        txt('t4.txt', state.co2)
+        txt('t7.txt', state.ph)
+        txt('t9.txt', state.ec)
+        val('j0.val', state.water_value_dis)
+        val('bt2.val', int(scheduler.is_enabled()))
         # Отображение состояния override
         val('bt3.val', int(get_sensor_override('water_sensor')))
-        if auto_mode:
+        if scheduler.is_enabled():
             val('bt0.val', int(lamp.is_working()))
             val('bt1.val', int(pump.is_working()))
     if 'page3' in page:
@@ -206,14 +248,61 @@ def handle_page(page):
         val("bt3.val", int(doz_4.is_working()))
 
 
-Thread(
-    target=main,
-    daemon=True
-).start()
-
-Thread(
-    target=auto,
-    daemon=True
-).start()
-
-while True: pass
+# Устройство -> (страница, компонент), где дисплей показывает его состояние
+device_components = {
+    lamp: ('page0', 'bt0.val'),
+    pump: ('page0', 'bt1.val'),
+    doz_1: ('page3', 'bt1.val'),
+    doz_2: ('page3', 'bt0.val'),
+    doz_3: ('page3', 'bt2.val'),
+    doz_4: ('page3', 'bt3.val'),
+}
+
+
+def show_device_state(page, component, working):
+    if display.get_page() != page:
+        return
+    # На главной странице лампа и помпа отображаются только в авторежиме
+    if page == 'page0' and not scheduler.is_enabled():
+        return
+    val(component, int(working))
+
+
+for dev, (page, component) in device_components.items():
+    dev.subscribe("on_change:working")(partial(show_device_state, page, component))
+
+
+def run():
+    """Запуск консольной версии под управлением супервизора"""
+    instrumentation.enabled = Instrumentation.ENABLED
+    supervisor = Supervisor()
+    supervisor.add("adc", adc.run)
+    supervisor.add("history-store", history_store.run)
+    for name, worker in sensors.get_workers().items():
+        supervisor.add(f"sensor:{name}", worker)
+    supervisor.add("main", main)
+    supervisor.add("auto", scheduler.run)
+    if Exporter.ENABLED:
+        supervisor.add("exporter", exporter.run)
+
+    # Хуки выполняются в обратном порядке: сначала выключаем устройства
+    supervisor.on_shutdown(GPIO.cleanup)
+    supervisor.on_shutdown(device.close)
+    supervisor.on_shutdown(device_bank.all_off)
+    # Порт читается без таймаута — прерываем блокирующее чтение
+    supervisor.on_stop(device.cancel_read)
+    supervisor.on_stop(scheduler.wake)
+    # Последняя пачка истории дописывается при завершении
+    supervisor.on_stop(history_store.wake)
+
+    # kill -USR1 <pid> печатает накопленные замеры, не останавливая работу
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1,
+                      lambda signum, frame: print(instrumentation.format_stats()))
+
+    print("Start listening sensors...\n")
+    supervisor.run()
+
+
+if __name__ == '__main__':
+    run()
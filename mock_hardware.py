@@ -0,0 +1,335 @@
+"""
+Эмуляция оборудования для запуска на ПК и обычном Linux.
+
+Все моки работают поверх одной модели установки (SimulatedFarm): бак с
+водой убывает, пока работает помпа, EC растёт от дозаторов, температура
+тянется за лампой. Время модели может идти быстрее реального (speedup)
+или только вручную через advance() — для нагрузочных тестов и бенчмарков.
+Шум датчиков берётся из генератора с фиксированным seed.
+"""
+import os
+import random
+from collections import deque
+from threading import Condition, Lock
+from time import monotonic, sleep
+from types import SimpleNamespace
+
+from config.config import Pins
+
+# Уровень бака -> (нижний датчик, верхний датчик) в той кодировке,
+# которую разбирает опрос воды в SensorsLifecycle
+_WATER_FULL = (0, 0)         # water_value_dis = 90, полив разрешён
+_WATER_HALF = (1, 0)         # water_value_dis = 50, полив разрешён
+_WATER_DRY = (0, 1)          # water_value_dis = 100, защита от сухого хода
+
+
+class SimulatedFarm:
+    """Модель гидропонной установки"""
+
+    AMBIENT_TEMPERATURE = 21.0
+    LAMP_TEMPERATURE = 28.0
+    # Постоянная времени прогрева/остывания, секунды модели
+    THERMAL_TAU = 1800.0
+    PUMP_FLOW = 50.0 / 3600       # доля бака в секунду: полный бак за ~72 мин
+    DOSER_EC_RATE = 2.0           # мкСм/см в секунду на один дозатор
+    DOSER_PH_RATE = -0.0005       # pH в секунду на один дозатор
+    CO2_AMBIENT = 420.0
+    CO2_UPTAKE = 0.05             # ppm в секунду под лампой
+
+    def __init__(self, speedup: float | None = 1.0, seed: int = 42,
+                 pwm_read_seconds: float = 1.004, dht_fail_rate: float = 0.05):
+        # speedup=None — ручное время: модель двигается только через advance()
+        self.speedup = speedup
+        self.pwm_read_seconds = pwm_read_seconds
+        self.dht_fail_rate = dht_fail_rate
+        self.__random = random.Random(seed)
+        self.__lock = Lock()
+        self.__real_start = monotonic()
+        self.__time = 0.0
+        self.__updated = 0.0
+
+        self.outputs = {}
+        self.water_level = 1.0
+        self.temperature = self.AMBIENT_TEMPERATURE
+        self.humidity = 60.0
+        self.co2 = self.CO2_AMBIENT
+        self.ec = 1200.0
+        self.ph = 6.0
+
+    @classmethod
+    def from_env(cls) -> 'SimulatedFarm':
+        speedup = os.environ.get('CITY_FARM_SPEEDUP', '1')
+        return cls(
+            speedup=None if speedup == 'manual' else float(speedup),
+            seed=int(os.environ.get('CITY_FARM_SEED', '42')),
+        )
+
+    def now(self) -> float:
+        """Время модели в секундах от старта"""
+        if self.speedup is None:
+            return self.__time
+        return (monotonic() - self.__real_start) * self.speedup
+
+    def advance(self, seconds: float):
+        """Сдвиг ручного времени модели"""
+        with self.__lock:
+            self.__time += seconds
+        self.step()
+
+    def noise(self, scale: float) -> float:
+        with self.__lock:
+            return self.__random.gauss(0.0, scale)
+
+    def chance(self, probability: float) -> bool:
+        with self.__lock:
+            return self.__random.random() < probability
+
+    def is_on(self, pin: int) -> bool:
+        # Реле включаются низким уровнем (SIG_ON = 0), по умолчанию выключены
+        return self.outputs.get(pin, 1) == 0
+
+    def set_output(self, pin: int, value: int):
+        self.step()
+        with self.__lock:
+            self.outputs[pin] = int(value)
+
+    def step(self):
+        """Продвинуть физику до текущего времени модели"""
+        with self.__lock:
+            now = self.now()
+            dt = now - self.__updated
+            if dt <= 0:
+                return
+            self.__updated = now
+
+            lamp = self.is_on(Pins.LAMP)
+            if self.is_on(Pins.PUMP):
+                self.water_level = max(0.0, self.water_level - self.PUMP_FLOW * dt)
+
+            dosers = sum(self.is_on(pin) for pin in
+                         (Pins.DOSER_1, Pins.DOSER_2, Pins.DOSER_3, Pins.DOSER_4))
+            self.ec += self.DOSER_EC_RATE * dosers * dt
+            self.ph = max(3.0, self.ph + self.DOSER_PH_RATE * dosers * dt)
+
+            target = self.LAMP_TEMPERATURE if lamp else self.AMBIENT_TEMPERATURE
+            self.temperature += (target - self.temperature) * min(1.0, dt / self.THERMAL_TAU)
+            self.humidity = max(30.0, min(90.0, 60.0 - (self.temperature - self.AMBIENT_TEMPERATURE) * 2))
+
+            if lamp:
+                self.co2 = max(300.0, self.co2 - self.CO2_UPTAKE * dt)
+            else:
+                self.co2 += (self.CO2_AMBIENT - self.co2) * min(1.0, dt / self.THERMAL_TAU)
+
+    def water_switches(self) -> tuple[int, int]:
+        self.step()
+        if self.water_level >= 0.5:
+            return _WATER_FULL
+        if self.water_level >= 0.2:
+            return _WATER_HALF
+        return _WATER_DRY
+
+    def refill(self, level: float = 1.0):
+        with self.__lock:
+            self.water_level = level
+
+
+farm = SimulatedFarm.from_env()
+
+
+class MockGPIO:
+    """Замена RPi.GPIO: выходы пишутся в модель, входы датчиков воды читаются из неё"""
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+
+    _mode = None
+    _directions = {}
+
+    @classmethod
+    def setmode(cls, mode):
+        cls._mode = mode
+
+    @classmethod
+    def setwarnings(cls, enabled):
+        pass
+
+    @classmethod
+    def setup(cls, channel, direction, initial=None, pull_up_down=None):
+        for pin in cls.__channels(channel):
+            cls._directions[pin] = direction
+            if direction == cls.OUT:
+                farm.set_output(pin, cls.HIGH if initial is None else initial)
+
+    @classmethod
+    def output(cls, channel, value):
+        pins = cls.__channels(channel)
+        values = value if isinstance(value, (list, tuple)) else [value] * len(pins)
+        if len(values) != len(pins):
+            raise ValueError("Number of channels != number of values")
+        for pin, item in zip(pins, values):
+            farm.set_output(pin, item)
+
+    @classmethod
+    def input(cls, channel):
+        if channel in (Pins.WATER_LOW_SENSOR, Pins.WATER_HIGH_SENSOR):
+            low, high = farm.water_switches()
+            return low if channel == Pins.WATER_LOW_SENSOR else high
+        return farm.outputs.get(channel, cls.HIGH)
+
+    @classmethod
+    def cleanup(cls, channel=None):
+        for pin in cls.__channels(channel) if channel is not None else list(cls._directions):
+            cls._directions.pop(pin, None)
+            farm.outputs.pop(pin, None)
+
+    @staticmethod
+    def __channels(channel) -> list:
+        return list(channel) if isinstance(channel, (list, tuple)) else [channel]
+
+
+class MockDHT22:
+    def __init__(self, pin, use_pulseio=True):
+        self.pin = pin
+
+    def __read(self, value: float, scale: float) -> float:
+        # Настоящий DHT22 регулярно не отвечает с первого раза
+        if farm.chance(farm.dht_fail_rate):
+            raise RuntimeError("DHT sensor not found, check wiring")
+        farm.step()
+        return round(value + farm.noise(scale), 1)
+
+    @property
+    def temperature(self):
+        return self.__read(farm.temperature, 0.1)
+
+    @property
+    def humidity(self):
+        return self.__read(farm.humidity, 0.5)
+
+    def exit(self):
+        pass
+
+
+class MockI2C:
+    def __init__(self, scl=None, sda=None, frequency=100000):
+        self.scl = scl
+        self.sda = sda
+
+    def deinit(self):
+        pass
+
+
+class MockADS1115:
+    """АЦП: канал P1 — датчик pH, P0 — датчик EC (как в PHSensor/ECSensor)"""
+    # Диапазон при gain=1 и масштаб 16-битного кода, как в adafruit_ads1x15
+    FULL_SCALE = 4.096
+    MAX_CODE = 32767
+
+    def __init__(self, i2c, gain=1, data_rate=None, mode=None, address=0x48):
+        self.i2c = i2c
+        self.gain = gain
+        self.data_rate = data_rate or 128
+        self.mode = mode
+
+    def read(self, pin, is_differential=False) -> int:
+        farm.step()
+        if pin == ADS1115.P1:
+            voltage = (farm.ph + farm.noise(0.02)) * 20 / 14 / 5
+        elif pin == ADS1115.P0:
+            voltage = (farm.ec + farm.noise(5.0)) * 20 / 500 * 1000 / 4400 / 5
+        else:
+            voltage = 0.0
+        code = int(voltage / self.FULL_SCALE * self.MAX_CODE)
+        return max(-self.MAX_CODE - 1, min(self.MAX_CODE, code))
+
+
+# Повторяет модуль adafruit_ads1x15.ads1115: класс АЦП и номера каналов
+ADS1115 = SimpleNamespace(ADS1115=MockADS1115, P0=0, P1=1, P2=2, P3=3)
+
+# Повторяет модуль board: только нужные нам пины шины I2C
+board = SimpleNamespace(SCL=3, SDA=2)
+
+
+class MockAnalogIn:
+    def __init__(self, ads: MockADS1115, positive_pin, negative_pin=None):
+        self.__ads = ads
+        self.__pin = positive_pin
+
+    @property
+    def value(self) -> int:
+        return self.__ads.read(self.__pin)
+
+    @property
+    def voltage(self) -> float:
+        return self.value * MockADS1115.FULL_SCALE / MockADS1115.MAX_CODE
+
+
+def mock_read_from_pwm(gpio=12, range=5000):
+    # Период ШИМ MH-Z19 около секунды — настоящее чтение блокирует поток
+    if farm.speedup:
+        sleep(farm.pwm_read_seconds / max(farm.speedup, 1.0))
+    farm.step()
+    return {'co2': int(farm.co2 + farm.noise(10.0))}
+
+
+class MockSerial:
+    """Порт дисплея в памяти: feed() имитирует кадры от Nextion,
+    всё записанное копится в written"""
+
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self.written = deque(maxlen=1024)
+        self.__incoming = bytearray()
+        self.__cond = Condition()
+        self.__cancelled = False
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.__incoming)
+
+    def feed(self, data: bytes):
+        with self.__cond:
+            self.__incoming += data
+            self.__cond.notify_all()
+
+    def read(self, size: int = 1) -> bytes:
+        with self.__cond:
+            self.__cond.wait_for(
+                lambda: self.__incoming or self.__cancelled or not self.is_open,
+                self.timeout
+            )
+            self.__cancelled = False
+            data = bytes(self.__incoming[:size])
+            del self.__incoming[:size]
+            return data
+
+    def read_all(self) -> bytes:
+        with self.__cond:
+            data = bytes(self.__incoming)
+            self.__incoming.clear()
+            return data
+
+    def write(self, data: bytes) -> int:
+        if not self.is_open:
+            raise OSError("port is closed")
+        self.written.append(bytes(data))
+        return len(data)
+
+    def cancel_read(self):
+        with self.__cond:
+            self.__cancelled = True
+            self.__cond.notify_all()
+
+    def close(self):
+        with self.__cond:
+            self.is_open = False
+            self.__cond.notify_all()
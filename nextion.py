@@ -0,0 +1,143 @@
+"""
+Протокол общения с дисплеем Nextion
+"""
+from contextlib import contextmanager
+from threading import Event, RLock
+
+from city_farm_class import end_byte
+
+
+class NextionReader:
+    """Блокирующее чтение порта и разбиение потока байт на кадры по end_byte"""
+
+    def __init__(self, device, encoding: str = 'koi8-r', max_frame: int = 256):
+        self.__device = device
+        self.__encoding = encoding
+        self.__max_frame = max_frame
+        self.__buffer = bytearray()
+
+    def frames(self, stop: Event):
+        """Генератор декодированных кадров; завершается при выставленном stop"""
+        while not stop.is_set():
+            try:
+                # Блокируемся до первого байта, затем забираем всё, что уже пришло
+                chunk = self.__device.read(self.__device.in_waiting or 1)
+            except Exception:
+                if stop.is_set():
+                    return
+                raise
+            if chunk:
+                yield from self.parse(chunk)
+
+    def parse(self, chunk: bytes):
+        """Разбор очередной порции байт; неполный кадр ждёт следующей порции.
+        Нужен там, где порт читает не frames(), а цикл событий"""
+        buffer = self.__buffer
+        buffer += chunk
+        while True:
+            end = buffer.find(end_byte)
+            if end < 0:
+                break
+            frame = bytes(buffer[:end]).strip(b'\x00\r\n ')
+            del buffer[:end + len(end_byte)]
+            if frame:
+                yield frame.decode(self.__encoding, errors='replace')
+
+        # Мусор без терминатора не должен копиться бесконечно
+        if len(buffer) > self.__max_frame:
+            buffer.clear()
+
+
+class NextionCommands:
+    """Таблица команд дисплея: токен до первого '/' -> обработчик(args)"""
+
+    def __init__(self):
+        self.__handlers = {}
+
+    def register(self, *names: str):
+        def decorator(handler):
+            for name in names:
+                self.__handlers[name] = handler
+            return handler
+
+        return decorator
+
+    def dispatch(self, frame: str) -> bool:
+        token, _, rest = frame.partition('/')
+        handler = self.__handlers.get(token.strip())
+        if handler is None:
+            return False
+
+        args = rest.split('/') if rest else []
+        try:
+            handler(token.strip(), args)
+        except Exception as ex:
+            print(f"Error occurred on command {frame!r}", ex, sep="\n")
+        return True
+
+
+class NextionDisplay:
+    """Буфер вывода на дисплей: склеивает обновление страницы в одну запись.
+
+    Прошлые значения не сравниваются: загрузка страницы сбрасывает её
+    компоненты на дисплее, а кнопки и поля пользователь меняет прямо на
+    панели, поэтому каждое значение отправляется заново.
+    """
+
+    def __init__(self, device):
+        self.__device = device
+        self.__lock = RLock()
+        self.__prefixes = {}
+        self.__buffer = bytearray()
+        self.__depth = 0
+        self.__page = None
+
+    def get_page(self) -> str | None:
+        return self.__page
+
+    def val(self, name, value):
+        self.__put(name, str(value).encode())
+
+    def txt(self, name, value):
+        self.__put(name, b'"' + str(value).encode() + b'"')
+
+    @contextmanager
+    def batch(self):
+        """Все изменения внутри блока уходят в порт одной записью"""
+        with self.__lock:
+            self.__depth += 1
+            try:
+                yield self
+            finally:
+                self.__depth -= 1
+                if self.__depth == 0:
+                    self.__flush()
+
+    @contextmanager
+    def page(self, page: str):
+        """Обновление только что загруженной страницы"""
+        with self.batch():
+            self.set_page(page)
+            yield self
+
+    def set_page(self, page: str):
+        """Дисплей загрузил страницу, в том числе ту же самую"""
+        with self.__lock:
+            self.__page = page
+
+    def __put(self, name, payload: bytes):
+        with self.__lock:
+            prefix = self.__prefixes.get(name)
+            if prefix is None:
+                prefix = self.__prefixes[name] = str(name).encode() + b'='
+            self.__buffer += prefix + payload + end_byte
+
+            if self.__depth == 0:
+                self.__flush()
+
+    def __flush(self):
+        if not self.__buffer:
+            return
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+        self.__device.write(data)
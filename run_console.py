@@ -8,8 +8,12 @@ import os
 sys.path.append(os.path.dirname(__file__))
 
 try:
-    from main import main
+    # Один цикл asyncio вместо потоков: --asyncio или CITY_FARM_RUNTIME=asyncio
+    if '--asyncio' in sys.argv or os.environ.get('CITY_FARM_RUNTIME') == 'asyncio':
+        from async_runtime import run
+    else:
+        from main import run
     print("🚀 Запуск консольной версии...")
-    main()
+    run()
 except Exception as e:
     print(f"❌ Ошибка запуска: {e}")
\ No newline at end of file
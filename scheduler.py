@@ -0,0 +1,87 @@
+"""
+Автоматический режим: переключение лампы и помпы по расписанию
+"""
+from datetime import datetime
+from threading import Event
+from time import perf_counter
+
+from city_farm_class import ScheduleEngine, read_settings
+from devices.devices import IDevice
+from telemetry.instrumentation import instrumentation
+
+
+class AutoScheduler:
+    """Спит до ближайшего переключения по расписанию, смены настроек или режима"""
+
+    def __init__(self, lamp: IDevice, pump: IDevice, water_ok: callable,
+                 max_sleep: float = 60.0):
+        self.__lamp = lamp
+        self.__pump = pump
+        self.__water_ok = water_ok
+        # Ограничение сна: внешняя правка settings.json и перевод часов
+        self.__max_sleep = max_sleep
+        self.__engine = ScheduleEngine()
+        self.__enabled = False
+        self.__wakeup = Event()
+        self.__wake_listeners = []
+
+    def is_enabled(self) -> bool:
+        return self.__enabled
+
+    def set_enabled(self, enabled: bool):
+        self.__enabled = enabled
+        self.wake()
+
+    def wake(self):
+        """Немедленный пересчёт: изменились настройки, режим или уровень воды"""
+        self.__wakeup.set()
+        for callback in self.__wake_listeners:
+            callback()
+
+    def add_wake_listener(self, callback: callable):
+        """callback() вызывается при каждом wake() из того потока, что его вызвал"""
+        self.__wake_listeners.append(callback)
+
+    def step(self) -> float | None:
+        """Один пересчёт расписания: сколько секунд спать до следующего,
+        None — авторежим выключен и ждать нужно только wake()"""
+        if not self.__enabled:
+            return None
+        now = datetime.now()
+        day = self.__engine.get(read_settings(), now)
+        self.apply(day, now)
+
+        timeout = (day.next_transition(now) - datetime.now()).total_seconds()
+        return min(max(timeout, 0), self.__max_sleep)
+
+    def run(self, stop: Event):
+        while not stop.is_set():
+            self.__wakeup.clear()
+            if not self.__enabled:
+                self.__wakeup.wait()
+                continue
+
+            measured = instrumentation.enabled
+            if measured:
+                started = perf_counter()
+            timeout = self.step()
+            if timeout is None:
+                continue
+            if measured:
+                applied = perf_counter()
+                instrumentation.observe("callback_ms", "auto", (applied - started) * 1000)
+                deadline = applied + timeout
+            if not self.__wakeup.wait(timeout) and measured:
+                # Опоздание считаем только для пробуждения по таймеру, не по wake()
+                instrumentation.observe("wake_lag_ms", "auto", (perf_counter() - deadline) * 1000)
+
+    def apply(self, day, now: datetime):
+        if day.is_lamp_on(now):
+            self.__lamp.on()
+        else:
+            self.__lamp.off()
+
+        if day.is_watering(now) and self.__water_ok():
+            self.__pump.on()
+        else:
+            self.__pump.off()
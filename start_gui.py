@@ -2,31 +2,78 @@
 import sys
 import os
 import subprocess
+from importlib.util import find_spec
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# После успешной проверки зависимостей следующие запуски её пропускают
+DEPS_MARKER = os.path.join(BASE_DIR, '.deps_checked')
+
+# Пакет pip -> импортируемый модуль
+GUI_DEPENDENCIES = {
+    'PyQt5': 'PyQt5',
+    'pyserial': 'serial',
+}
+
+# Драйверы нужны только на Raspberry Pi, на ПК работает mock_hardware
+RASPBERRY_DEPENDENCIES = {
+    'RPi.GPIO': 'RPi.GPIO',
+    'adafruit-circuitpython-dht': 'adafruit_dht',
+    'adafruit-circuitpython-ads1x15': 'adafruit_ads1x15',
+    'mh-z19': 'mh_z19',
+    'adafruit-blinka': 'busio',
+}
+
+
+def is_installed(module):
+    """Проверка наличия модуля без его импорта"""
+    try:
+        return find_spec(module) is not None
+    except ModuleNotFoundError:
+        # Нет родительского пакета, например RPi для RPi.GPIO
+        return False
+
+
+def get_marker_key():
+    """Ключ маркера: интерпретатор и версия requirements.txt"""
+    requirements = os.path.join(BASE_DIR, 'requirements.txt')
+    try:
+        stamp = os.stat(requirements).st_mtime_ns
+    except OSError:
+        stamp = 0
+    return f"{sys.executable}\n{sys.version}\n{stamp}\n"
+
+
+def is_checked():
+    try:
+        with open(DEPS_MARKER, 'r', encoding='utf-8') as f:
+            return f.read() == get_marker_key()
+    except OSError:
+        return False
 
 
 def check_dependencies():
     """Проверка и установка зависимостей"""
-    try:
-        from PyQt6 import QtWidgets
-    except ImportError:
-        print("Установка PyQt6...")
-        subprocess.check_call(
-            [sys.executable, "-m", "pip", "install", "PyQt6"])
-
-    # Проверка других зависимостей
-    dependencies = [
-        'RPi.GPIO',
-        'adafruit-circuitpython-dht',
-        'adafruit-circuitpython-ads1x15'
-    ]
-
-    for dep in dependencies:
-        try:
-            __import__(dep.replace('-', '_'))
-        except ImportError:
-            print(f"Установка {dep}...")
+    if is_checked():
+        return
+
+    from hardware_manager import probe
+    is_emulation, _ = probe()
+
+    dependencies = dict(GUI_DEPENDENCIES)
+    if not is_emulation:
+        dependencies.update(RASPBERRY_DEPENDENCIES)
+
+    for package, module in dependencies.items():
+        if not is_installed(module):
+            print(f"Установка {package}...")
             subprocess.check_call(
-                [sys.executable, "-m", "pip", "install", dep])
+                [sys.executable, "-m", "pip", "install", package])
+
+    try:
+        with open(DEPS_MARKER, 'w', encoding='utf-8') as f:
+            f.write(get_marker_key())
+    except OSError as e:
+        print(f"Не удалось сохранить отметку проверки зависимостей: {e}")
 
 
 def main():
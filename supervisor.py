@@ -0,0 +1,131 @@
+"""
+Супервизор рабочих потоков консольной версии
+"""
+import signal
+import traceback
+from threading import Event, Lock, Thread
+
+
+class Supervisor:
+    """Держит рабочие потоки, перезапускает упавшие и корректно завершает работу"""
+
+    def __init__(self, restart_delay: float = 1.0, join_timeout: float = 2.0):
+        self.__restart_delay = restart_delay
+        self.__join_timeout = join_timeout
+        self.__stopping = Event()
+        self.__wakeup = Event()
+        self.__lock = Lock()
+        self.__workers = {}
+        self.__threads = {}
+        self.__restarts = {}
+        self.__stop_hooks = []
+        self.__shutdown_hooks = []
+
+    @property
+    def stopping(self) -> Event:
+        """Событие завершения — рабочие циклы должны проверять его вместо while True"""
+        return self.__stopping
+
+    def add(self, name: str, target: callable):
+        """Регистрирует рабочий поток; target вызывается как target(stopping)"""
+        self.__workers[name] = target
+        self.__restarts[name] = 0
+
+    def on_shutdown(self, callback: callable) -> callable:
+        """Регистрирует функцию, вызываемую при завершении (в обратном порядке)"""
+        self.__shutdown_hooks.append(callback)
+        return callback
+
+    def on_stop(self, callback: callable) -> callable:
+        """Регистрирует функцию, прерывающую блокирующий ввод-вывод рабочих потоков"""
+        self.__stop_hooks.append(callback)
+        return callback
+
+    def get_restarts(self) -> dict:
+        return dict(self.__restarts)
+
+    def start(self):
+        for name in self.__workers:
+            self.__spawn(name)
+
+    def stop(self):
+        """Запрос на завершение; безопасно вызывать из обработчика сигнала"""
+        self.__stopping.set()
+        self.__wakeup.set()
+
+    def run(self):
+        """Блокирует главный поток до SIGTERM/SIGINT, перезапуская упавшие потоки"""
+        signal.signal(signal.SIGTERM, self.__handle_signal)
+        signal.signal(signal.SIGINT, self.__handle_signal)
+
+        self.start()
+        try:
+            while not self.__stopping.is_set():
+                self.__wakeup.wait()
+                self.__wakeup.clear()
+                if self.__stopping.is_set():
+                    break
+                self.__restart_dead()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.stop()
+        self.__run_hooks(self.__stop_hooks)
+
+        with self.__lock:
+            threads = list(self.__threads.values())
+        for thread in threads:
+            thread.join(self.__join_timeout)
+            if thread.is_alive():
+                print(f"[supervisor] {thread.name} не завершился вовремя")
+
+        self.__run_hooks(reversed(self.__shutdown_hooks))
+        self.__shutdown_hooks.clear()
+
+    @staticmethod
+    def __run_hooks(hooks):
+        for callback in hooks:
+            try:
+                callback()
+            except Exception as ex:
+                print("[supervisor] Ошибка при завершении", ex, sep="\n")
+
+    def __handle_signal(self, signum, frame):
+        print(f"\n[supervisor] Получен сигнал {signal.Signals(signum).name}, завершение...")
+        self.stop()
+
+    def __spawn(self, name: str):
+        thread = Thread(
+            target=self.__wrap(name, self.__workers[name]),
+            name=name,
+            daemon=True
+        )
+        with self.__lock:
+            self.__threads[name] = thread
+        thread.start()
+
+    def __wrap(self, name: str, target: callable) -> callable:
+        def run():
+            try:
+                target(self.__stopping)
+            except Exception:
+                print(f"[supervisor] Поток {name} упал:")
+                traceback.print_exc()
+            finally:
+                # Будим супервизор: поток либо упал, либо вышел раньше времени
+                self.__wakeup.set()
+
+        return run
+
+    def __restart_dead(self):
+        with self.__lock:
+            dead = [name for name, thread in self.__threads.items()
+                    if not thread.is_alive()]
+        for name in dead:
+            # Пауза защищает от бесконечного цикла быстрых падений
+            if self.__stopping.wait(self.__restart_delay):
+                return
+            self.__restarts[name] += 1
+            print(f"[supervisor] Перезапуск {name} (#{self.__restarts[name]})")
+            self.__spawn(name)
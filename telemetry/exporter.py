@@ -0,0 +1,153 @@
+"""
+HTTP-эндпоинт /metrics в текстовом формате Prometheus.
+
+Ответ собирается из того, что уже лежит в памяти: снимок SensorsState,
+теневые регистры устройств и гистограммы instrumentation. Оборудование
+при опросе не читается, а готовый текст переиспользуется cache_seconds
+секунд, поэтому частые опросы почти не нагружают процессор.
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from telemetry.instrumentation import instrumentation as default_instrumentation
+
+PREFIX = "city_farm"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Метрика instrumentation -> имя метки в Prometheus
+LABEL_NAMES = {
+    "sensor_read_ms": "sensor",
+    "sensor_errors": "sensor",
+    "command_ms": "command",
+    "adc_sample_ms": "channel",
+    "adc_errors": "channel",
+    "worker_errors": "worker",
+}
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value))
+
+
+class MetricsExporter:
+    def __init__(self, state, devices: list, host: str = "0.0.0.0", port: int = 9100,
+                 cache_seconds: float = 1.0, instrumentation=default_instrumentation):
+        self.__state = state
+        self.__devices = devices
+        self.__address = (host, port)
+        self.__cache_seconds = cache_seconds
+        self.__instrumentation = instrumentation
+        self.__lock = Lock()
+        self.__body = None
+        self.__rendered = 0.0
+        self.__stop = Event()
+        self.__stats = {'scrapes': 0, 'renders': 0}
+
+    def start(self):
+        Thread(target=self.run, args=(self.__stop,), name="exporter", daemon=True).start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def run(self, stop: Event):
+        server = HTTPServer(self.__address, self.__get_handler())
+        # handle_request ждёт запрос не дольше timeout и даёт проверить stop
+        server.timeout = 1.0
+        try:
+            while not stop.is_set():
+                server.handle_request()
+        finally:
+            server.server_close()
+
+    def get_stats(self) -> dict:
+        with self.__lock:
+            return dict(self.__stats)
+
+    def render(self) -> bytes:
+        """Текст для опроса; пересобирается не чаще раза в cache_seconds"""
+        now = monotonic()
+        with self.__lock:
+            self.__stats['scrapes'] += 1
+            if self.__body is None or now - self.__rendered >= self.__cache_seconds:
+                self.__body = self.__render().encode()
+                self.__rendered = now
+                self.__stats['renders'] += 1
+            return self.__body
+
+    def __render(self) -> str:
+        lines = []
+
+        snapshot = self.__state.snapshot()
+        self.__header(lines, "sensor_value", "gauge", "Последнее значение датчика")
+        for field in self.__state.FIELDS:
+            value = getattr(snapshot, field)
+            lines.append(f'{PREFIX}_sensor_value{{sensor="{field}"}} {format_value(value)}')
+        self.__header(lines, "state_version", "counter", "Номер версии SensorsState")
+        lines.append(f"{PREFIX}_state_version {snapshot.version}")
+        self.__header(lines, "state_timestamp_seconds", "gauge", "Время последнего изменения SensorsState")
+        lines.append(f"{PREFIX}_state_timestamp_seconds {format_value(snapshot.timestamp)}")
+
+        self.__header(lines, "device_on", "gauge", "Устройство включено (теневой регистр)")
+        for device in self.__devices:
+            lines.append(f'{PREFIX}_device_on{{device="{escape_label(device.get_name())}"}} '
+                         f'{int(device.is_working())}')
+
+        stats = self.__instrumentation.get_stats()
+        for metric, labels in sorted(stats['counters'].items()):
+            name = f"{metric}_total"
+            label_name = LABEL_NAMES.get(metric, "name")
+            self.__header(lines, name, "counter", f"Счётчик {metric}")
+            for label, value in sorted(labels.items()):
+                lines.append(f'{PREFIX}_{name}{{{label_name}="{escape_label(label)}"}} {value}')
+
+        for metric, labels in sorted(stats['histograms'].items()):
+            # Гистограммы хранятся в мс, Prometheus ожидает секунды
+            name = metric[:-3] + "_seconds" if metric.endswith("_ms") else metric
+            label_name = LABEL_NAMES.get(metric, "worker")
+            self.__header(lines, name, "histogram", f"Гистограмма {metric}")
+            for label, item in sorted(labels.items()):
+                tag = f'{label_name}="{escape_label(label)}"'
+                for bound, count in item['buckets']:
+                    le = format_value(bound / 1000 if bound != float('inf') else bound)
+                    lines.append(f'{PREFIX}_{name}_bucket{{{tag},le="{le}"}} {count}')
+                lines.append(f'{PREFIX}_{name}_sum{{{tag}}} {format_value(item["sum"] / 1000)}')
+                lines.append(f'{PREFIX}_{name}_count{{{tag}}} {item["count"]}')
+
+        lines.append("")
+        return "\n".join(lines)
+
+    @staticmethod
+    def __header(lines: list, name: str, kind: str, description: str):
+        lines.append(f"# HELP {PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    def __get_handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Сервер однопоточный: молчащий клиент не должен держать его дольше
+            timeout = 5.0
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Каждый опрос в консоль не пишем
+                pass
+
+        return Handler
@@ -0,0 +1,144 @@
+"""
+История показаний датчиков в памяти: кольцевой буфер фиксированного размера на метрику
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from math import ceil
+from threading import Lock
+
+from config.config import SensorIntervals
+
+# Метрики SensorsState, которые имеет смысл хранить как временной ряд
+METRICS = ("temperature", "humidity", "co2", "ec", "ph", "water_value_dis", "block_water")
+
+# Метрика -> датчик в SensorIntervals, который её обновляет
+METRIC_SENSORS = {
+    "temperature": "temperature",
+    "humidity": "humidity",
+    "co2": "co2",
+    "ec": "ec",
+    "ph": "ph",
+    "water_value_dis": "water",
+    "block_water": "water",
+}
+
+HISTORY_SECONDS = 24 * 3600
+
+
+class RingBuffer:
+    """Пары (время, значение) в двух массивах: 8 байт на время + 4 байта на float32"""
+
+    def __init__(self, capacity: int):
+        self.__capacity = capacity
+        self.__times = array('d', bytes(8 * capacity))
+        self.__values = array('f', bytes(4 * capacity))
+        self.__start = 0
+        self.__size = 0
+        self.__lock = Lock()
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def get_capacity(self) -> int:
+        return self.__capacity
+
+    def append(self, timestamp: float, value: float):
+        with self.__lock:
+            if self.__size:
+                # Время не должно идти назад, иначе сломается бинарный поиск
+                timestamp = max(timestamp, self.__times[self.__physical(self.__size - 1)])
+            if self.__size < self.__capacity:
+                index = self.__physical(self.__size)
+                self.__size += 1
+            else:
+                index = self.__start
+                self.__start = (self.__start + 1) % self.__capacity
+            self.__times[index] = timestamp
+            self.__values[index] = value
+
+    def latest(self) -> tuple[float, float] | None:
+        with self.__lock:
+            if not self.__size:
+                return None
+            index = self.__physical(self.__size - 1)
+            return self.__times[index], self.__values[index]
+
+    def last(self, n: int) -> tuple[array, array]:
+        """Последние n точек: (времена, значения)"""
+        with self.__lock:
+            n = min(n, self.__size)
+            return self.__slice(self.__size - n, self.__size)
+
+    def range(self, since: float, until: float | None = None) -> tuple[array, array]:
+        """Точки с since <= время <= until: (времена, значения)"""
+        with self.__lock:
+            view = _TimesView(self)
+            lo = bisect_left(view, since)
+            hi = self.__size if until is None else bisect_right(view, until)
+            return self.__slice(lo, max(lo, hi))
+
+    def _time_at(self, logical: int) -> float:
+        return self.__times[self.__physical(logical)]
+
+    def __physical(self, logical: int) -> int:
+        return (self.__start + logical) % self.__capacity
+
+    def __slice(self, lo: int, hi: int) -> tuple[array, array]:
+        if lo >= hi:
+            return array('d'), array('f')
+        a, b = self.__physical(lo), self.__physical(hi - 1) + 1
+        if a < b:
+            return self.__times[a:b], self.__values[a:b]
+        return (self.__times[a:] + self.__times[:b],
+                self.__values[a:] + self.__values[:b])
+
+
+class _TimesView:
+    """Логическая последовательность времён кольцевого буфера для bisect"""
+
+    def __init__(self, ring: RingBuffer):
+        self.__ring = ring
+
+    def __len__(self):
+        return len(self.__ring)
+
+    def __getitem__(self, index):
+        return self.__ring._time_at(index)
+
+
+class SensorsHistory:
+    """Кольцевые буферы для всех метрик SensorsState.
+    Размер буфера — period секунд при интервале опроса датчика метрики:
+    за сутки 43200 точек на DHT22, pH и EC, 17280 на CO2 и 86400 на каждую
+    метрику воды, всего ~4.4 МБ"""
+
+    def __init__(self, period: float = HISTORY_SECONDS, intervals: dict | None = None,
+                 metrics: tuple = METRICS):
+        if intervals is None:
+            intervals = SensorIntervals.as_dict()
+        self.__buffers = {
+            metric: RingBuffer(ceil(period / intervals[METRIC_SENSORS.get(metric, metric)]))
+            for metric in metrics
+        }
+
+    def attach(self, state):
+        state.add_sink(self.record)
+        return self
+
+    def record(self, metric: str, value, timestamp: float):
+        buffer = self.__buffers.get(metric)
+        if buffer is None or value is None:
+            return
+        buffer.append(timestamp, float(value))
+
+    def get(self, metric: str) -> RingBuffer:
+        return self.__buffers[metric]
+
+    def last(self, metric: str, n: int) -> tuple[array, array]:
+        return self.__buffers[metric].last(n)
+
+    def range(self, metric: str, since: float, until: float | None = None) -> tuple[array, array]:
+        return self.__buffers[metric].range(since, until)
+
+    def get_memory_usage(self) -> int:
+        return sum(12 * buffer.get_capacity() for buffer in self.__buffers.values())
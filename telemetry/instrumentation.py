@@ -0,0 +1,140 @@
+"""
+Встроенные замеры горячих путей: задержка чтения датчиков, ошибки,
+опоздание пробуждения рабочих циклов и длительность обработчиков.
+
+Все значения копятся в гистограммах с фиксированными границами, поэтому
+память не растёт со временем работы. При instrumentation.enabled = False
+точки замера не вызывают даже perf_counter(); счётчики ошибок (count)
+ведутся всегда — они срабатывают только на исключениях и ничего не стоят
+в нормальной работе.
+"""
+from array import array
+from bisect import bisect_left
+from threading import Lock
+
+# Верхние границы интервалов гистограммы, мс; последний интервал — всё, что больше
+BOUNDS_MS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000,
+)
+
+
+class Histogram:
+    """Счётчики по фиксированным интервалам плюс сумма, минимум и максимум"""
+
+    def __init__(self, bounds: tuple = BOUNDS_MS):
+        self.__bounds = bounds
+        self.__counts = array('Q', bytes(8 * (len(bounds) + 1)))
+        self.__count = 0
+        self.__sum = 0.0
+        self.__min = 0.0
+        self.__max = 0.0
+        self.__lock = Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.__bounds, value)
+        with self.__lock:
+            self.__counts[i] += 1
+            if not self.__count or value < self.__min:
+                self.__min = value
+            if not self.__count or value > self.__max:
+                self.__max = value
+            self.__count += 1
+            self.__sum += value
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            counts = self.__counts.tolist()
+            count, total = self.__count, self.__sum
+            low, high = self.__min, self.__max
+        return {
+            'count': count,
+            'sum': total,
+            'min': low,
+            'max': high,
+            'mean': total / count if count else 0.0,
+            'p50': self.__quantile(counts, count, 0.5, high),
+            'p90': self.__quantile(counts, count, 0.9, high),
+            'p99': self.__quantile(counts, count, 0.99, high),
+            # Накопительные счётчики: сколько значений не больше границы
+            'buckets': self.__cumulative(counts),
+        }
+
+    def __cumulative(self, counts: list) -> list:
+        result = []
+        running = 0
+        for bound, item in zip(self.__bounds, counts):
+            running += item
+            result.append((bound, running))
+        result.append((float('inf'), running + counts[-1]))
+        return result
+
+    def __quantile(self, counts: list, count: int, q: float, high: float) -> float:
+        """Верхняя граница интервала, в который попадает квантиль"""
+        if not count:
+            return 0.0
+        rank = q * count
+        running = 0
+        for bound, item in zip(self.__bounds, counts):
+            running += item
+            if running >= rank:
+                return min(bound, high)
+        return high
+
+
+class Instrumentation:
+    """Реестр гистограмм и счётчиков: метрика -> метка -> значение"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.__histograms = {}
+        self.__counters = {}
+        self.__lock = Lock()
+
+    def observe(self, metric: str, label: str, value_ms: float):
+        histogram = self.__histograms.get((metric, label))
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault((metric, label), Histogram())
+        histogram.observe(value_ms)
+
+    def count(self, metric: str, label: str, n: int = 1):
+        with self.__lock:
+            key = (metric, label)
+            self.__counters[key] = self.__counters.get(key, 0) + n
+
+    def get_stats(self) -> dict:
+        """{'histograms': {метрика: {метка: срез}}, 'counters': {метрика: {метка: n}}}"""
+        with self.__lock:
+            histograms = list(self.__histograms.items())
+            counters = list(self.__counters.items())
+        stats = {'enabled': self.enabled, 'histograms': {}, 'counters': {}}
+        for (metric, label), histogram in histograms:
+            stats['histograms'].setdefault(metric, {})[label] = histogram.snapshot()
+        for (metric, label), value in counters:
+            stats['counters'].setdefault(metric, {})[label] = value
+        return stats
+
+    def format_stats(self) -> str:
+        """Сводка для консоли: по строке на гистограмму и счётчик"""
+        stats = self.get_stats()
+        lines = [f"Instrumentation ({'on' if stats['enabled'] else 'off'}):"]
+        for metric, labels in sorted(stats['histograms'].items()):
+            for label, item in sorted(labels.items()):
+                lines.append(
+                    f"   {metric}[{label}]: n={item['count']} mean={item['mean']:.3f} "
+                    f"p50<={item['p50']:.3f} p99<={item['p99']:.3f} max={item['max']:.3f}"
+                )
+        for metric, labels in sorted(stats['counters'].items()):
+            for label, value in sorted(labels.items()):
+                lines.append(f"   {metric}[{label}]: {value}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self.__lock:
+            self.__histograms.clear()
+            self.__counters.clear()
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,156 @@
+"""
+Агрегаты показаний датчиков (min/max/mean/count) по минутам, часам и дням.
+
+Каждое показание обновляет открытый интервал за O(1); закрытые интервалы
+хранятся в компактных кольцевых массивах, поэтому запрос за неделю не
+трогает сырые показания.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from time import localtime
+from typing import NamedTuple
+
+from telemetry.history import METRICS
+
+# Уровень: (шаг в секундах, сколько закрытых интервалов хранить)
+LEVELS = {
+    "minute": (60, 7 * 24 * 60),
+    "hour": (3600, 90 * 24),
+    "day": (86400, 2 * 366),
+}
+
+
+class Bucket(NamedTuple):
+    start: float
+    min: float
+    max: float
+    mean: float
+    count: int
+
+
+class Rollup:
+    """Агрегаты одной метрики с шагом resolution секунд; 24 байта на интервал"""
+
+    def __init__(self, resolution: int, capacity: int, utc_offset: int = 0):
+        self.__resolution = resolution
+        self.__capacity = capacity
+        # Сдвиг границ интервалов, чтобы сутки начинались в местную полночь
+        self.__offset = utc_offset
+        self.__starts = array('d', bytes(8 * capacity))
+        self.__mins = array('f', bytes(4 * capacity))
+        self.__maxs = array('f', bytes(4 * capacity))
+        self.__means = array('f', bytes(4 * capacity))
+        self.__counts = array('I', bytes(4 * capacity))
+        self.__head = 0
+        self.__size = 0
+        self.__lock = Lock()
+
+        self.__start = None
+        self.__min = 0.0
+        self.__max = 0.0
+        self.__sum = 0.0
+        self.__count = 0
+
+    def add(self, timestamp: float, value: float):
+        start = timestamp - (timestamp + self.__offset) % self.__resolution
+        with self.__lock:
+            if start != self.__start:
+                if self.__start is not None and start < self.__start:
+                    # Часы ушли назад — досчитываем в текущий интервал
+                    start = self.__start
+                else:
+                    self.__close()
+                    self.__start = start
+                    self.__min = self.__max = value
+                    self.__sum = 0.0
+                    self.__count = 0
+
+            if value < self.__min:
+                self.__min = value
+            elif value > self.__max:
+                self.__max = value
+            self.__sum += value
+            self.__count += 1
+
+    def buckets(self, since: float = 0.0, until: float | None = None,
+                include_open: bool = True) -> list[Bucket]:
+        """Интервалы, начало которых попадает в [since, until]"""
+        with self.__lock:
+            view = _StartsView(self)
+            lo = bisect_left(view, since)
+            hi = self.__size if until is None else bisect_right(view, until)
+            result = [self.__bucket(i) for i in range(lo, hi)]
+            if include_open and self.__count and self.__start >= since \
+                    and (until is None or self.__start <= until):
+                result.append(Bucket(self.__start, self.__min, self.__max,
+                                     self.__sum / self.__count, self.__count))
+            return result
+
+    def _start_at(self, logical: int) -> float:
+        return self.__starts[(self.__head + logical) % self.__capacity]
+
+    def _get_size(self) -> int:
+        return self.__size
+
+    def __bucket(self, logical: int) -> Bucket:
+        i = (self.__head + logical) % self.__capacity
+        return Bucket(self.__starts[i], self.__mins[i], self.__maxs[i],
+                      self.__means[i], self.__counts[i])
+
+    def __close(self):
+        if not self.__count:
+            return
+        if self.__size < self.__capacity:
+            i = (self.__head + self.__size) % self.__capacity
+            self.__size += 1
+        else:
+            i = self.__head
+            self.__head = (self.__head + 1) % self.__capacity
+        self.__starts[i] = self.__start
+        self.__mins[i] = self.__min
+        self.__maxs[i] = self.__max
+        self.__means[i] = self.__sum / self.__count
+        self.__counts[i] = self.__count
+
+
+class _StartsView:
+    def __init__(self, rollup: Rollup):
+        self.__rollup = rollup
+
+    def __len__(self):
+        return self.__rollup._get_size()
+
+    def __getitem__(self, index):
+        return self.__rollup._start_at(index)
+
+
+class SensorsRollups:
+    """Минутные, часовые и дневные агрегаты для всех метрик SensorsState"""
+
+    def __init__(self, levels: dict = None, metrics: tuple = METRICS):
+        levels = levels or LEVELS
+        utc_offset = localtime().tm_gmtoff
+        self.__rollups = {
+            metric: {
+                level: Rollup(resolution, capacity, utc_offset)
+                for level, (resolution, capacity) in levels.items()
+            }
+            for metric in metrics
+        }
+
+    def attach(self, state):
+        state.add_sink(self.record)
+        return self
+
+    def record(self, metric: str, value, timestamp: float):
+        levels = self.__rollups.get(metric)
+        if levels is None or value is None:
+            return
+        value = float(value)
+        for rollup in levels.values():
+            rollup.add(timestamp, value)
+
+    def get(self, metric: str, level: str = "minute", since: float = 0.0,
+            until: float | None = None) -> list[Bucket]:
+        return self.__rollups[metric][level].buckets(since, until)
@@ -0,0 +1,229 @@
+"""
+Постоянное хранилище истории датчиков: сегментный журнал только на дописывание.
+
+Показания копятся в памяти и записываются пачкой раз в flush_interval секунд
+(групповой коммит с одним fsync). Каждая пачка — отдельный кадр с длиной и CRC,
+поэтому после отключения питания теряется не больше последней пачки, а
+недописанный хвост сегмента просто отбрасывается при чтении.
+"""
+import os
+import struct
+import zlib
+from collections import deque
+from threading import Event, Lock, Thread
+from time import time
+
+from telemetry.history import METRICS
+
+# Кадр: магия, число записей, CRC32 тела; тело — записи (время, метрика, значение)
+_FRAME_HEADER = struct.Struct('<4sII')
+_RECORD = struct.Struct('<dBf')
+_MAGIC = b'SHB1'
+_SEGMENT_SUFFIX = '.seg'
+# Размер блока SD-карты/ФС: fsync переписывает каждый затронутый блок целиком
+_BLOCK_SIZE = 4096
+
+
+class HistoryStore:
+    def __init__(
+            self,
+            directory: str = 'history',
+            flush_interval: float = 60.0,
+            max_batch: int = 4096,
+            segment_max_bytes: int = 4 * 1024 * 1024,
+            segment_max_age: float = 24 * 3600,
+            retention_bytes: int = 256 * 1024 * 1024,
+            metrics: tuple = METRICS,
+    ):
+        self.__directory = directory
+        self.__flush_interval = flush_interval
+        self.__max_batch = max_batch
+        self.__segment_max_bytes = segment_max_bytes
+        self.__segment_max_age = segment_max_age
+        self.__retention_bytes = retention_bytes
+        self.__metric_ids = {metric: i for i, metric in enumerate(metrics)}
+        self.__metrics = metrics
+
+        self.__lock = Lock()
+        self.__write_lock = Lock()
+        # Если диск не успевает, отбрасываются самые старые показания
+        self.__pending = deque(maxlen=max_batch * 4)
+        self.__wakeup = Event()
+        self.__stop = Event()
+
+        self.__segment = None
+        self.__segment_path = None
+        self.__segment_opened = 0.0
+        self.__segment_size = 0
+
+        # Учёт усиления записи: полезные байты против реально записанных
+        self.__stats = {
+            'records': 0,
+            'payload_bytes': 0,
+            'written_bytes': 0,
+            'block_bytes': 0,
+            'batches': 0,
+            'fsyncs': 0,
+            'segments_rotated': 0,
+            'segments_deleted': 0,
+            'dropped': 0,
+        }
+
+        os.makedirs(directory, exist_ok=True)
+
+    def attach(self, state):
+        state.add_sink(self.record)
+        return self
+
+    def record(self, metric: str, value, timestamp: float):
+        metric_id = self.__metric_ids.get(metric)
+        if metric_id is None or value is None:
+            return
+        with self.__lock:
+            if len(self.__pending) == self.__pending.maxlen:
+                self.__stats['dropped'] += 1
+            self.__pending.append((timestamp, metric_id, float(value)))
+            if len(self.__pending) >= self.__max_batch:
+                self.__wakeup.set()
+
+    def start(self):
+        Thread(target=self.run, args=(self.__stop,), name="history-store", daemon=True).start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__wakeup.set()
+
+    def run(self, stop: Event):
+        """Цикл групповых коммитов; при остановке дописывает последнюю пачку"""
+        try:
+            while not stop.is_set():
+                self.__wakeup.wait(self.__flush_interval)
+                self.__wakeup.clear()
+                self.flush()
+        finally:
+            self.flush()
+            self.close()
+
+    def wake(self):
+        self.__wakeup.set()
+
+    def flush(self):
+        with self.__lock:
+            batch, self.__pending = self.__pending, deque(maxlen=self.__pending.maxlen)
+        if not batch:
+            return
+
+        body = b''.join(_RECORD.pack(*item) for item in batch)
+        frame = _FRAME_HEADER.pack(_MAGIC, len(batch), zlib.crc32(body)) + body
+
+        with self.__write_lock:
+            try:
+                segment = self.__get_segment(len(frame))
+                segment.write(frame)
+                os.fsync(segment.fileno())
+            except OSError:
+                # Хвост сегмента мог оборваться — следующие кадры пишем в новый
+                if self.__segment is not None:
+                    self.__segment.close()
+                    self.__segment = None
+                # Пачка не записана: возвращаем её в очередь до следующей попытки
+                self.__requeue(batch)
+                raise
+            first_block = self.__segment_size // _BLOCK_SIZE
+            self.__segment_size += len(frame)
+            last_block = -(-self.__segment_size // _BLOCK_SIZE)
+
+            self.__stats['records'] += len(batch)
+            self.__stats['payload_bytes'] += len(body)
+            self.__stats['written_bytes'] += len(frame)
+            self.__stats['block_bytes'] += (last_block - first_block) * _BLOCK_SIZE
+            self.__stats['batches'] += 1
+            self.__stats['fsyncs'] += 1
+
+    def __requeue(self, batch: deque):
+        with self.__lock:
+            pending = self.__pending
+            # Очередь ограничена: при переполнении уходят самые старые показания
+            overflow = len(batch) + len(pending) - pending.maxlen
+            if overflow > 0:
+                self.__stats['dropped'] += overflow
+            batch.extend(pending)
+            self.__pending = batch
+
+    def close(self):
+        with self.__write_lock:
+            if self.__segment is not None:
+                self.__segment.close()
+                self.__segment = None
+
+    def get_stats(self) -> dict:
+        with self.__write_lock:
+            stats = dict(self.__stats)
+        # dropped меняется в record() под другой блокировкой
+        with self.__lock:
+            stats['dropped'] = self.__stats['dropped']
+        payload = stats['payload_bytes']
+        # Отношение байт, переписанных на носителе, к полезным данным
+        stats['write_amplification'] = stats['block_bytes'] / payload if payload else 0.0
+        return stats
+
+    def read(self, metric: str | None = None, since: float = 0.0,
+             until: float | None = None):
+        """Генератор (время, метрика, значение) по всем целым кадрам всех сегментов"""
+        metric_id = None if metric is None else self.__metric_ids[metric]
+        for path in self.__segments():
+            for timestamp, item_id, value in self.__read_segment(path):
+                if metric_id is not None and item_id != metric_id:
+                    continue
+                if timestamp < since or (until is not None and timestamp > until):
+                    continue
+                yield timestamp, self.__metrics[item_id], value
+
+    def __get_segment(self, incoming: int):
+        expired = time() - self.__segment_opened > self.__segment_max_age
+        too_big = self.__segment_size + incoming > self.__segment_max_bytes
+        if self.__segment is not None and (expired or too_big):
+            self.__segment.close()
+            self.__segment = None
+            self.__stats['segments_rotated'] += 1
+
+        if self.__segment is None:
+            self.__segment_opened = time()
+            self.__segment_path = os.path.join(
+                self.__directory, f"{int(self.__segment_opened * 1000):015d}{_SEGMENT_SUFFIX}")
+            self.__segment = open(self.__segment_path, 'ab', buffering=0)
+            self.__segment_size = self.__segment.tell()
+            self.__enforce_retention()
+        return self.__segment
+
+    def __enforce_retention(self):
+        segments = self.__segments()
+        sizes = {path: os.path.getsize(path) for path in segments}
+        total = sum(sizes.values())
+        for path in segments:
+            if total <= self.__retention_bytes or path == self.__segment_path:
+                break
+            os.remove(path)
+            total -= sizes[path]
+            self.__stats['segments_deleted'] += 1
+
+    def __segments(self) -> list:
+        names = sorted(name for name in os.listdir(self.__directory)
+                       if name.endswith(_SEGMENT_SUFFIX))
+        return [os.path.join(self.__directory, name) for name in names]
+
+    @staticmethod
+    def __read_segment(path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + _FRAME_HEADER.size <= len(data):
+            magic, count, crc = _FRAME_HEADER.unpack_from(data, offset)
+            start = offset + _FRAME_HEADER.size
+            end = start + count * _RECORD.size
+            if magic != _MAGIC or end > len(data) or zlib.crc32(data[start:end]) != crc:
+                # Оборванная запись при отключении питания — дальше читать нечего
+                return
+            for item in _RECORD.iter_unpack(data[start:end]):
+                yield item
+            offset = end